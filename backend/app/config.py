@@ -1,6 +1,5 @@
 """Configuration settings for the Data QA Agent backend."""
 from pydantic_settings import BaseSettings
-from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -14,6 +13,33 @@ class Settings(BaseSettings):
     google_cloud_project: str = "miruna-sandpit"
     vertex_ai_location: str = "us-central1"
     vertex_ai_model: str = "gemini-2.5-flash"
+    # Consecutive suggestion failures before pausing suggestions, and for how long
+    vertex_ai_failure_threshold: int = 3
+    vertex_ai_cooldown_seconds: float = 60
+    # Config runs group up to this many mappings per suggestion call, waiting
+    # at most this long for a batch to fill
+    vertex_ai_suggestion_batch_size: int = 5
+    vertex_ai_suggestion_batch_wait_seconds: float = 0.5
+    
+    # BigQuery
+    bq_max_concurrency: int = 32
+    # Run queries with jobs.query (query_and_wait) instead of insert + poll
+    bq_use_query_and_wait: bool = False
+    # Let short queries run without creating a job (JOB_CREATION_OPTIONAL preview)
+    bq_job_creation_optional: bool = False
+    # On-demand query price, used to estimate test cost for cost guards
+    bq_price_per_tib_usd: float = 6.25
+    # Mappings of a config table processed at once
+    max_concurrent_mappings: int = 8
+    # Seconds table metadata is cached; 0 disables (e.g. while schemas change mid-run)
+    bq_metadata_cache_ttl: float = 300
+    # Seconds test query results are reused across runs; 0 (default) always
+    # re-queries so reruns see fixed data
+    query_result_cache_ttl: float = 0
+    
+    # GCS
+    # Seconds resolved wildcard patterns are cached; 0 disables
+    gcs_pattern_cache_ttl: float = 60
     
     # CORS
     cors_origins: list[str] = [
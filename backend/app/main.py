@@ -1,20 +1,23 @@
 """Main FastAPI application for Data QA Agent backend."""
+import json
 import logging
+import os
+from collections import Counter
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.models import (
     GenerateTestsRequest,
-    GenerateTestsResponse,
     ConfigTableResponse,
     HealthResponse,
     TestSummary,
     ConfigTableSummary,
     CustomTestRequest
 )
-from app.services.test_executor import test_executor
+from app.services.test_executor import test_executor, add_to_summary
 
 # Configure logging
 logging.basicConfig(
@@ -28,8 +31,14 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown events."""
     logger.info("Starting Data QA Agent Backend...")
+    if settings.bq_job_creation_optional:
+        # google-cloud-bigquery reads this when building jobs.query
+        # requests; it lets short queries skip creating a job
+        os.environ.setdefault("QUERY_PREVIEW_ENABLED", "TRUE")
     yield
     logger.info("Shutting down Data QA Agent Backend...")
+    from app.services.bigquery_service import bigquery_service
+    bigquery_service.close()
 
 
 # Create FastAPI app
@@ -138,12 +147,13 @@ async def generate_tests(request: GenerateTestsRequest):
             
             result = await test_executor.process_mapping(request.project_id, mapping)
             
-            # Calculate summary
+            # Calculate summary in a single pass over the results
+            status_counts = Counter(t.status for t in result.predefined_results)
             summary = TestSummary(
                 total_tests=len(result.predefined_results),
-                passed=len([t for t in result.predefined_results if t.status == 'PASS']),
-                failed=len([t for t in result.predefined_results if t.status == 'FAIL']),
-                errors=len([t for t in result.predefined_results if t.status == 'ERROR'])
+                passed=status_counts['PASS'],
+                failed=status_counts['FAIL'],
+                errors=status_counts['ERROR']
             )
             
             # Prepare response data
@@ -233,12 +243,72 @@ async def generate_tests(request: GenerateTestsRequest):
 
 
 
+@app.post("/api/generate-tests/stream")
+async def generate_tests_stream(request: GenerateTestsRequest):
+    """
+    Execute config table tests, streaming each mapping's result as NDJSON.
+    
+    Emits one {"type": "mapping", "result": ...} line per mapping as it
+    completes and a final {"type": "summary", "summary": ...} line. Failures
+    after the stream has started are reported as an {"type": "error"} line.
+    """
+    if request.comparison_mode != 'gcs-config':
+        raise HTTPException(
+            status_code=400,
+            detail="Streaming is only supported for comparison_mode 'gcs-config'"
+        )
+    if not request.config_dataset or not request.config_table:
+        raise HTTPException(
+            status_code=400,
+            detail="Missing required fields: config_dataset, config_table"
+        )
+    
+    async def ndjson_lines():
+        summary = Counter()
+        try:
+            async for result in test_executor.process_config_table_streaming(
+                project_id=request.project_id,
+                config_dataset=request.config_dataset,
+                config_table=request.config_table
+            ):
+                add_to_summary(summary, result)
+                yield f'{{"type": "mapping", "result": {result.model_dump_json()}}}\n'
+        except Exception as e:
+            logger.error(f"Error streaming config table results: {str(e)}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        
+        summary_data = ConfigTableSummary(**summary).dict()
+        yield json.dumps({"type": "summary", "summary": summary_data}) + "\n"
+        
+        # Results were not kept, so only the summary is logged
+        try:
+            from app.services.bigquery_service import bigquery_service
+            await bigquery_service.log_execution(
+                project_id=request.project_id,
+                execution_data={
+                    "comparison_mode": "gcs_config_table",
+                    "source": f"{request.config_dataset}.{request.config_table}",
+                    "target": "Multiple Targets",
+                    "status": "AT_RISK" if summary_data['failed'] > 0 else "PASS",
+                    "total_tests": summary_data['total_tests'],
+                    "passed_tests": summary_data['passed'],
+                    "failed_tests": summary_data['failed'],
+                    "details": {"summary": summary_data}
+                }
+            )
+        except Exception as e:
+            logger.error(f"Failed to log config execution: {e}")
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
 @app.get("/api/history")
-async def get_test_history(project_id: str = settings.google_cloud_project, limit: int = 50):
-    """Get previous test runs from BigQuery."""
+async def get_test_history(project_id: str = settings.google_cloud_project, limit: int = 50, days: int = 0):
+    """Get previous test runs from BigQuery, optionally only from the last N days."""
     try:
         from app.services.bigquery_service import bigquery_service
-        return await bigquery_service.get_execution_history(project_id=project_id, limit=limit)
+        return await bigquery_service.get_execution_history(project_id=project_id, limit=limit, days=days)
     except Exception as e:
         logger.error(f"Error fetching history: {e}")
         return []
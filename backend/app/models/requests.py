@@ -1,6 +1,6 @@
 """Pydantic models for API requests."""
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List
 
 
 class GenerateTestsRequest(BaseModel):
@@ -33,7 +33,7 @@ class TestResult(BaseModel):
     test_name: str
     category: Optional[str] = None
     description: str
-    status: str  # PASS, FAIL, ERROR
+    status: str  # PASS, FAIL, ERROR, SKIPPED
     severity: str  # HIGH, MEDIUM, LOW
     sql_query: str
     rows_affected: int = 0
@@ -44,7 +44,7 @@ class MappingInfo(BaseModel):
     """Information about a data mapping."""
     source: str
     target: str
-    file_row_count: int
+    file_row_count: Optional[int] = None  # None when row_count_match is not enabled
     table_row_count: int
 
 
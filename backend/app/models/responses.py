@@ -1,6 +1,6 @@
 """Pydantic models for API responses."""
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List
 from .requests import TestResult, MappingResult
 
 
@@ -19,6 +19,7 @@ class ConfigTableSummary(BaseModel):
     passed: int = 0
     failed: int = 0
     errors: int = 0
+    skipped: int = 0  # Held back by a mapping's cost guard
     total_suggestions: int = 0
 
 
@@ -1,7 +1,24 @@
 """BigQuery service for database operations."""
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
+import asyncio
+import functools
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import bigquery
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    
+    def _json_dumps(value: Any) -> str:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    def _json_dumps(value: Any) -> str:
+        return json.dumps(value, default=str)
+
+from app.config import settings
+from app.services.ttl_cache import TTLCache
 
 
 class BigQueryService:
@@ -10,19 +27,56 @@ class BigQueryService:
     def __init__(self):
         """Initialize BigQuery service."""
         self._client = None
+        # The client is first used from worker threads; build it only once
+        self._client_lock = threading.Lock()
+        # Schemas change on DDL timescales; reuse metadata across requests
+        self._metadata_cache = TTLCache(settings.bq_metadata_cache_ttl)
+        # Bookkeeping tables known to exist; the ensure_* helpers skip their
+        # dataset/table probes for these
+        self._verified_tables = set()
+        # Blocking client calls run here, sized to the executor's BigQuery
+        # concurrency cap
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.bq_max_concurrency,
+            thread_name_prefix="bigquery"
+        )
 
     @property
     def client(self):
         """Lazy load BigQuery client."""
         if not self._client:
-            self._client = bigquery.Client()
+            with self._client_lock:
+                if not self._client:
+                    client = bigquery.Client()
+                    # The default urllib3 pool keeps 10 connections per host;
+                    # size it to the worker threads so concurrent calls
+                    # reuse warm connections
+                    adapter = HTTPAdapter(
+                        pool_connections=4,
+                        pool_maxsize=settings.bq_max_concurrency
+                    )
+                    client._http.mount("https://", adapter)
+                    self._client = client
         return self._client
     
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking client call on the service's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+    
+    def close(self) -> None:
+        """Shut down the thread pool and release pooled connections."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._client:
+            self._client.close()
+            self._client = None
+    
     async def get_table_metadata(
         self, 
         project_id: str, 
         dataset_id: str, 
-        table_id: str
+        table_id: str,
+        refresh: bool = False
     ) -> Dict[str, Any]:
         """
         Get metadata for a BigQuery table.
@@ -31,13 +85,33 @@ class BigQueryService:
             project_id: Google Cloud project ID
             dataset_id: BigQuery dataset ID
             table_id: BigQuery table ID
+            refresh: Fetch current metadata (e.g. for its row count) and
+                update the cache, instead of reusing a cached entry
             
         Returns:
             Dictionary containing table metadata
         """
+        table_ref = f"{project_id}.{dataset_id}.{table_id}"
+        if refresh:
+            metadata = await self._fetch_table_metadata(table_ref)
+            self._metadata_cache.set(table_ref, metadata)
+            return metadata
+        return await self._metadata_cache.get_or_set(
+            table_ref, lambda: self._fetch_table_metadata(table_ref)
+        )
+    
+    def invalidate_table(self, full_table_name: str) -> None:
+        """Forget cached metadata for a table after it is created or altered."""
+        self._metadata_cache.invalidate(full_table_name)
+    
+    def invalidate_tables(self, pattern: str) -> None:
+        """Forget cached metadata for every table whose full name matches a regex."""
+        self._metadata_cache.invalidate_pattern(pattern)
+    
+    async def _fetch_table_metadata(self, table_ref: str) -> Dict[str, Any]:
+        """Fetch table metadata from the BigQuery API."""
         try:
-            table_ref = f"{project_id}.{dataset_id}.{table_id}"
-            table = self.client.get_table(table_ref)
+            table = await self._run_blocking(self.client.get_table, table_ref)
             
             return {
                 "full_table_name": table_ref,
@@ -52,13 +126,15 @@ class BigQueryService:
                     ]
                 },
                 "num_rows": table.num_rows,
+                "table_type": table.table_type,
+                "has_streaming_buffer": table.streaming_buffer is not None,
                 "created": table.created.isoformat() if table.created else None,
                 "modified": table.modified.isoformat() if table.modified else None
             }
             
         except Exception as e:
             raise ValueError(
-                f"Failed to get metadata for {project_id}.{dataset_id}.{table_id}: {str(e)}"
+                f"Failed to get metadata for {table_ref}: {str(e)}"
             )
     
     async def execute_query(self, query: str) -> List[Dict[str, Any]]:
@@ -72,25 +148,75 @@ class BigQueryService:
             List of dictionaries representing rows
         """
         try:
-            query_job = self.client.query(query)
-            results = query_job.result()
-            
-            # Convert to list of dicts
-            return [dict(row) for row in results]
+            # The client is blocking; run it off the event loop so
+            # concurrent queries actually overlap
+            return await self._run_blocking(self._run_query, query)
             
         except Exception as e:
             raise ValueError(f"Query execution failed: {str(e)}")
     
-    async def get_row_count(self, full_table_name: str) -> int:
+    async def execute_query_count(self, query: str) -> int:
+        """
+        Count the rows a query returns without fetching them.
+        
+        Args:
+            query: SQL query string
+            
+        Returns:
+            Number of result rows
+        """
+        results = await self.execute_query(f"SELECT COUNT(*) AS c FROM ({query})")
+        return int(results[0]['c'])
+    
+    async def dry_run(self, query: str) -> int:
+        """
+        Estimate the bytes a query would process, without running it.
+        
+        Args:
+            query: SQL query string
+            
+        Returns:
+            Estimated bytes processed
+        """
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        query_job = await self._run_blocking(self.client.query, query, job_config)
+        return int(query_job.total_bytes_processed or 0)
+    
+    def _run_query(self, query: str) -> List[Dict[str, Any]]:
+        """Run a query and fetch all rows as dicts (blocking)."""
+        if settings.bq_use_query_and_wait:
+            # jobs.query returns the first page of results with the completion
+            # response, saving the separate getQueryResults/tabledata.list calls
+            results = self.client.query_and_wait(query)
+        else:
+            results = self.client.query(query).result()
+        
+        # Convert to list of dicts
+        return [dict(row) for row in results]
+    
+    async def get_row_count(
+        self,
+        full_table_name: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
         """
         Get row count for a table.
         
         Args:
             full_table_name: Fully qualified table name (project.dataset.table)
+            metadata: Current metadata of the table, as from
+                get_table_metadata(refresh=True); fetched when omitted
             
         Returns:
             Number of rows
         """
+        # Table metadata carries the row count without scanning; views and
+        # tables with a streaming buffer still need a COUNT(*) query
+        if metadata is None:
+            metadata = await self._fetch_table_metadata(full_table_name)
+        if metadata["table_type"] == "TABLE" and not metadata["has_streaming_buffer"]:
+            return int(metadata["num_rows"] or 0)
+        
         query = f"SELECT COUNT(*) as count FROM `{full_table_name}`"
         results = await self.execute_query(query)
         return int(results[0]['count'])
@@ -110,9 +236,24 @@ class BigQueryService:
         Returns:
             List of dictionaries representing rows
         """
+        # tabledata.list reads rows directly, without a query job
+        rows = await self._run_blocking(self._list_rows, full_table_name, limit)
+        if rows is not None:
+            return rows
+        
+        # Views and external tables cannot be listed; query them instead
         query = f"SELECT * FROM `{full_table_name}` LIMIT {limit}"
         return await self.execute_query(query)
     
+    def _list_rows(self, full_table_name: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Read the first rows of a table as dicts, or None if it can't be listed (blocking)."""
+        # list_rows needs the table's schema anyway, so this is the only get
+        table = self.client.get_table(full_table_name)
+        if table.table_type != "TABLE":
+            return None
+        rows = self.client.list_rows(table, max_results=limit)
+        return [dict(row) for row in rows]
+    
     async def get_tables_in_dataset(
         self, 
         project_id: str, 
@@ -130,16 +271,20 @@ class BigQueryService:
         """
         try:
             dataset_ref = f"{project_id}.{dataset_id}"
-            dataset = self.client.get_dataset(dataset_ref)
-            tables = self.client.list_tables(dataset)
-            
-            return [table.table_id for table in tables]
+            return await self._run_blocking(self._list_table_ids, dataset_ref)
             
         except Exception as e:
             raise ValueError(
                 f"Failed to list tables in {project_id}.{dataset_id}: {str(e)}"
             )
     
+    def _list_table_ids(self, dataset_ref: str) -> List[str]:
+        """List table IDs in a dataset (blocking)."""
+        dataset = self.client.get_dataset(dataset_ref)
+        tables = self.client.list_tables(dataset)
+        
+        return [table.table_id for table in tables]
+    
     async def read_config_table(
         self, 
         project_id: str, 
@@ -178,9 +323,11 @@ class BigQueryService:
         Returns:
             Full table name
         """
+        full_table_name = f"{project_id}.{dataset_id}.{table_id}"
+        if full_table_name in self._verified_tables:
+            return full_table_name
+        
         try:
-            full_table_name = f"{project_id}.{dataset_id}.{table_id}"
-            
             # 1. Ensure dataset exists
             try:
                 self.client.get_dataset(f"{project_id}.{dataset_id}")
@@ -198,6 +345,7 @@ class BigQueryService:
             # 2. Check if table exists
             try:
                 self.client.get_table(full_table_name)
+                self._verified_tables.add(full_table_name)
                 return full_table_name
             except Exception:
                 # Table doesn't exist, create it
@@ -218,13 +366,21 @@ class BigQueryService:
             ]
             
             table = bigquery.Table(full_table_name, schema=schema)
+            # Daily partitions let time-windowed history reads prune old runs
+            table.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY,
+                field="timestamp"
+            )
+            table.clustering_fields = ["project_id", "comparison_mode", "status"]
             self.client.create_table(table)
+            self.invalidate_table(full_table_name)
+            self._verified_tables.add(full_table_name)
             print(f"Created history table: {full_table_name}")
             return full_table_name
             
         except Exception as e:
             print(f"Warning: Failed to ensure history table: {str(e)}")
-            return f"{project_id}.{dataset_id}.{table_id}"
+            return full_table_name
 
     async def log_execution(
         self,
@@ -261,10 +417,11 @@ class BigQueryService:
                 "total_tests": execution_data.get("total_tests", 0),
                 "passed_tests": execution_data.get("passed_tests", 0),
                 "failed_tests": execution_data.get("failed_tests", 0),
-                "details": json.dumps(execution_data.get("details", {}), default=str)
+                "details": _json_dumps(execution_data.get("details", {}))
             }
             
-            errors = self.client.insert_rows_json(full_table_name, [row])
+            # One streaming insert per run; keep its round trip off the event loop
+            errors = await self._run_blocking(self.client.insert_rows_json, full_table_name, [row])
             if errors:
                 print(f"Failed to insert history row: {errors}")
                 
@@ -276,19 +433,32 @@ class BigQueryService:
         project_id: str,
         dataset_id: str = "config",
         table_id: str = "execution_history",
-        limit: int = 50
+        limit: int = 50,
+        days: int = 0
     ) -> List[Dict[str, Any]]:
-        """Get recent execution history."""
+        """
+        Get recent execution history.
+        
+        Args:
+            days: Only return runs from the last N days (0 returns all). On a
+                partitioned history table this prunes older partitions.
+        """
         try:
             # Ensure table exists before querying to avoid NotFound errors
             await self.ensure_history_table(project_id, dataset_id, table_id)
             
+            where = (
+                f"WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(days)} DAY)"
+                if days > 0 else ""
+            )
             query = f"""
                 SELECT *
                 FROM `{project_id}.{dataset_id}.{table_id}`
+                {where}
                 ORDER BY timestamp DESC
-                LIMIT {limit}
+                LIMIT {int(limit)}
             """
+            return await self.execute_query(query)
         except Exception as e:
             print(f"Failed to fetch history: {str(e)}")
             return []
@@ -305,9 +475,11 @@ class BigQueryService:
         Returns:
             Full table name
         """
+        full_table_name = f"{project_id}.{dataset_id}.{table_id}"
+        if full_table_name in self._verified_tables:
+            return full_table_name
+        
         try:
-            full_table_name = f"{project_id}.{dataset_id}.{table_id}"
-            
             # 1. Ensure dataset exists (reuse logic or rely on history table check having done it, but safer to check)
             try:
                 self.client.get_dataset(f"{project_id}.{dataset_id}")
@@ -322,6 +494,7 @@ class BigQueryService:
             # 2. Check if table exists
             try:
                 self.client.get_table(full_table_name)
+                self._verified_tables.add(full_table_name)
                 return full_table_name
             except Exception:
                 pass
@@ -341,12 +514,14 @@ class BigQueryService:
             
             table = bigquery.Table(full_table_name, schema=schema)
             self.client.create_table(table)
+            self.invalidate_table(full_table_name)
+            self._verified_tables.add(full_table_name)
             print(f"Created custom tests table: {full_table_name}")
             return full_table_name
             
         except Exception as e:
             print(f"Warning: Failed to ensure custom tests table: {str(e)}")
-            return f"{project_id}.{dataset_id}.{table_id}"
+            return full_table_name
 
     async def save_custom_test(
         self,
@@ -376,7 +551,8 @@ class BigQueryService:
                 "is_active": True
             }
             
-            errors = self.client.insert_rows_json(full_table_name, [row])
+            # Streaming insert of the saved test, run off the event loop
+            errors = await self._run_blocking(self.client.insert_rows_json, full_table_name, [row])
             if errors:
                 print(f"Failed to insert custom test: {errors}")
                 return False
@@ -1,9 +1,109 @@
 """GCS (Google Cloud Storage) service for file operations."""
+import asyncio
+import csv
+import gzip
+import itertools
 import re
-from typing import List, Dict
+from typing import BinaryIO, List, Dict
 from google.cloud import storage
-import pandas as pd
 import io
+from app.config import settings
+from app.services.ttl_cache import TTLCache
+
+
+_COUNT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Characters a blank CSV line may hold; pandas skips such lines
+_BLANK_CHARS = b' \t\r'
+
+# A newline followed by a line holding only blank characters
+_BLANK_LINE = re.compile(rb'\n[ \t\r]*(?=\n)')
+
+
+def _count_csv_lines(stream: BinaryIO) -> int:
+    """
+    Count CSV records in a binary stream, including the header.
+    
+    Reads fixed-size chunks and counts newlines with bytes.count, which runs
+    in C, while no '"' has been seen. A quote only opens a quoted field at
+    the start of a field (a stray inch mark is plain text), which takes a
+    real parser to tell, so from the line holding the first quote on the
+    rest of the stream is read with csv.reader. Lines holding only
+    whitespace are not records, matching pandas' skip_blank_lines.
+    """
+    lines = 0
+    # Text of the current record read so far
+    tail = b''
+    while chunk := stream.read(_COUNT_CHUNK_SIZE):
+        data = tail + chunk
+        quote = data.find(b'"')
+        if quote != -1:
+            start = data.rfind(b'\n', 0, quote) + 1
+            return lines + _count_plain_lines(data[:start]) + _count_csv_records(data[start:], stream)
+        
+        end = data.rfind(b'\n') + 1
+        lines += _count_plain_lines(data[:end])
+        tail = data[end:]
+    
+    # A final record without a trailing newline still counts
+    if tail.strip(_BLANK_CHARS):
+        lines += 1
+    return lines
+
+
+def _count_plain_lines(data: bytes) -> int:
+    """Count the non-blank lines of quote-free text made of whole lines."""
+    return data.count(b'\n') - len(_BLANK_LINE.findall(b'\n' + data))
+
+
+def _count_csv_records(head: bytes, stream: BinaryIO) -> int:
+    """
+    Count the non-blank CSV records in head followed by the rest of stream.
+    
+    head starts at a record boundary. Bytes are decoded as latin-1, which
+    never fails and keeps the ASCII delimiters, quotes and newlines of
+    UTF-8 and other ASCII-compatible encodings in place.
+    """
+    text = io.TextIOWrapper(stream, encoding='latin-1', newline='')
+    head_lines = io.StringIO(head.decode('latin-1'), newline='').readlines()
+    if head_lines and not head_lines[-1].endswith(('\n', '\r')):
+        # The chunk ended mid-line; csv.reader ends a record with each line
+        head_lines[-1] += text.readline()
+    
+    # Whitespace-only lines are blank records, or lie inside a quoted field
+    # whose record they don't end; either way they can be dropped
+    lines = (line for line in itertools.chain(head_lines, text) if line.strip(' \t\r\n'))
+    return sum(1 for _ in csv.reader(lines))
+
+
+def _wildcard_match(pattern: str, name: str) -> bool:
+    """
+    Match name against a pattern where '*' matches any run of characters.
+    
+    Iterative two-pointer scan: on a mismatch, backtrack to the last '*'
+    and let it absorb one more character. No regex is compiled.
+    """
+    p = n = 0
+    star = -1
+    star_n = 0
+    while n < len(name):
+        if p < len(pattern) and pattern[p] == '*':
+            star = p
+            star_n = n
+            p += 1
+        elif p < len(pattern) and pattern[p] == name[n]:
+            p += 1
+            n += 1
+        elif star != -1:
+            p = star + 1
+            star_n += 1
+            n = star_n
+        else:
+            return False
+    
+    while p < len(pattern) and pattern[p] == '*':
+        p += 1
+    return p == len(pattern)
 
 
 class GCSService:
@@ -12,6 +112,8 @@ class GCSService:
     def __init__(self):
         """Initialize GCS service."""
         self._client = None
+        # Many mappings share a bucket/pattern; skip repeated LIST calls
+        self._pattern_cache = TTLCache(settings.gcs_pattern_cache_ttl)
 
     @property
     def client(self):
@@ -39,36 +141,42 @@ class GCSService:
             return [pattern]
         
         try:
-            bucket = self.client.bucket(bucket_name)
-            
-            # Get prefix before wildcard
-            prefix = pattern.split('*')[0]
-            
-            # List files with prefix
-            blobs = bucket.list_blobs(prefix=prefix)
-            
-            # Convert pattern to regex
-            regex_pattern = pattern.replace('*', '.*')
-            regex = re.compile(f'^{regex_pattern}$')
-            
-            # Filter matching files
-            matching_files = [
-                blob.name for blob in blobs
-                if regex.match(blob.name)
-            ]
+            matching_files = await self._pattern_cache.get_or_set(
+                (bucket_name, pattern),
+                lambda: asyncio.to_thread(self._list_matching, bucket_name, pattern)
+            )
             
             if not matching_files:
+                # Don't remember a miss; the file may be uploaded right after
+                self._pattern_cache.invalidate((bucket_name, pattern))
                 raise ValueError(
                     f"No files found matching pattern: gs://{bucket_name}/{pattern}"
                 )
             
-            return matching_files
+            return list(matching_files)
             
         except Exception as e:
             raise ValueError(
                 f"Failed to resolve pattern gs://{bucket_name}/{pattern}: {str(e)}"
             )
     
+    def _list_matching(self, bucket_name: str, pattern: str) -> List[str]:
+        """List the files in a bucket that match a wildcard pattern (blocking)."""
+        bucket = self.client.bucket(bucket_name)
+        
+        # List files with the prefix before the first wildcard
+        prefix = pattern.split('*')[0]
+        blobs = bucket.list_blobs(prefix=prefix)
+        
+        return [
+            blob.name for blob in blobs
+            if _wildcard_match(pattern, blob.name)
+        ]
+    
+    def invalidate(self, bucket_name: str) -> None:
+        """Forget resolved patterns for a bucket, e.g. after new files land."""
+        self._pattern_cache.invalidate_where(lambda key: key[0] == bucket_name)
+    
     async def count_csv_rows(self, bucket_name: str, file_path: str) -> int:
         """
         Count rows in a CSV file.
@@ -81,25 +189,35 @@ class GCSService:
             Number of rows (excluding header)
         """
         try:
-            bucket = self.client.bucket(bucket_name)
-            blob = bucket.blob(file_path)
-            
-            if not blob.exists():
-                raise FileNotFoundError(
-                    f"File not found: gs://{bucket_name}/{file_path}"
-                )
-            
-            # Download and count rows using pandas
-            content = blob.download_as_bytes()
-            df = pd.read_csv(io.BytesIO(content))
-            
-            return len(df)
+            return await asyncio.to_thread(self._count_csv_rows, bucket_name, file_path)
             
         except Exception as e:
             raise ValueError(
                 f"Failed to count rows in gs://{bucket_name}/{file_path}: {str(e)}"
             )
     
+    def _count_csv_rows(self, bucket_name: str, file_path: str) -> int:
+        """Stream a CSV file and count its data rows (blocking)."""
+        bucket = self.client.bucket(bucket_name)
+        blob = bucket.blob(file_path)
+        
+        if not blob.exists():
+            raise FileNotFoundError(
+                f"File not found: gs://{bucket_name}/{file_path}"
+            )
+        
+        # Stream instead of downloading whole file; gzipped exports are
+        # inflated on the fly
+        with blob.open('rb', chunk_size=_COUNT_CHUNK_SIZE) as f:
+            if file_path.endswith('.gz'):
+                with gzip.GzipFile(fileobj=f) as gz:
+                    lines = _count_csv_lines(gz)
+            else:
+                lines = _count_csv_lines(f)
+        
+        # Exclude header
+        return max(lines - 1, 0)
+    
     async def sample_csv_data(
         self, 
         bucket_name: str, 
@@ -118,26 +236,37 @@ class GCSService:
             List of dictionaries representing rows
         """
         try:
-            bucket = self.client.bucket(bucket_name)
-            blob = bucket.blob(file_path)
-            
-            if not blob.exists():
-                raise FileNotFoundError(
-                    f"File not found: gs://{bucket_name}/{file_path}"
-                )
-            
-            # Download and sample using pandas
-            content = blob.download_as_bytes()
-            df = pd.read_csv(io.BytesIO(content), nrows=limit)
-            
-            # Convert to list of dicts
-            return df.to_dict('records')
+            # Blocking download/parse runs in a worker thread so other
+            # coroutines keep running
+            return await asyncio.to_thread(
+                self._sample_csv_data, bucket_name, file_path, limit
+            )
             
         except Exception as e:
             raise ValueError(
                 f"Failed to sample data from gs://{bucket_name}/{file_path}: {str(e)}"
             )
     
+    def _sample_csv_data(self, bucket_name: str, file_path: str, limit: int) -> List[Dict]:
+        """Download a CSV file and parse its first rows (blocking)."""
+        bucket = self.client.bucket(bucket_name)
+        blob = bucket.blob(file_path)
+        
+        if not blob.exists():
+            raise FileNotFoundError(
+                f"File not found: gs://{bucket_name}/{file_path}"
+            )
+        
+        # Download and sample using pandas (imported on first use; it is
+        # slow to load and only needed for sampling)
+        import pandas as pd
+        
+        content = blob.download_as_bytes()
+        df = pd.read_csv(io.BytesIO(content), nrows=limit)
+        
+        # Convert to list of dicts
+        return df.to_dict('records')
+    
     async def get_csv_headers(self, bucket_name: str, file_path: str) -> List[str]:
         """
         Get column headers from a CSV file.
@@ -159,6 +288,8 @@ class GCSService:
                 )
             
             # Download and get headers using pandas
+            import pandas as pd
+            
             content = blob.download_as_bytes()
             df = pd.read_csv(io.BytesIO(content), nrows=0)
             
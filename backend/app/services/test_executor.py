@@ -1,24 +1,336 @@
 """Test executor service for orchestrating test execution."""
+import asyncio
+import functools
+import hashlib
+import itertools
 import logging
-from typing import Dict, List, Any, Optional
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple, Callable, Awaitable, AsyncIterator
 import json
+import re
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+from app.config import settings
 from app.services.gcs_service import gcs_service
 from app.services.bigquery_service import bigquery_service
 from app.services.vertex_ai_service import vertex_ai_service
-from app.tests.predefined_tests import get_enabled_tests
+from app.services.ttl_cache import TTLCache
+from app.tests.predefined_tests import PREDEFINED_TESTS, VIOLATION_ROW_LIMIT, get_enabled_tests, TestTemplate
 from app.models import TestResult, MappingInfo, AISuggestion, MappingResult
 
 logger = logging.getLogger(__name__)
 
+# Column names inferred as primary keys (besides "<table>_id")
+_PK_NAME_HINTS = frozenset({'id', 'key', 'uuid', 'guid'})
+
+# Column types checked for statistical outliers
+_NUMERIC_TYPES = frozenset({'INTEGER', 'FLOAT', 'NUMERIC', 'BIGNUMERIC'})
+
+# Bytes in a TiB, the unit BigQuery on-demand queries are billed in
+_BYTES_PER_TIB = 2 ** 40
+
+# Longest error message kept on a result
+_MAX_ERROR_CHARS = 512
+
+# Functions whose results change between runs; queries using them are never
+# served from the cross-run result cache
+_VOLATILE_SQL = re.compile(
+    r'\b(?:CURRENT_(?:DATE|DATETIME|TIME|TIMESTAMP)|NOW|RAND|GENERATE_UUID|SESSION_USER)\s*\(',
+    re.IGNORECASE
+)
+
+
+def _config_key(test_config: Dict[str, Any]) -> str:
+    """Canonical, hashable form of a test_config for caching generated SQL."""
+    return json.dumps(test_config, sort_keys=True, default=str)
+
+
+def _render_test_sql(
+    test: TestTemplate,
+    test_config: Dict[str, Any]
+) -> Tuple[Optional[str], Optional[str]]:
+    """Generate a test's SQL and, for single-table checks, its violation predicate."""
+    sql = test.generate_sql(test_config)
+    predicate = test.generate_predicate(test_config) if sql and test.generate_predicate else None
+    return sql, predicate
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_test_sql(test_id: str, config_key: str) -> Tuple[Optional[str], Optional[str]]:
+    """Process-wide memo of generated SQL per (test_id, canonical test_config)."""
+    return _render_test_sql(PREDEFINED_TESTS[test_id], _json_loads(config_key))
+
+
+def _error_text(error: Exception) -> str:
+    """Error message stored on a result, capped so large API errors stay small."""
+    return str(error)[:_MAX_ERROR_CHARS]
+
+
+def _sql_key(sql: str) -> str:
+    """Short digest of a query, used to coalesce identical SQL within a run."""
+    return hashlib.blake2b(sql.encode(), digest_size=16).hexdigest()
+
+
+def _result_key(sql: str) -> str:
+    """Cross-run cache key for a query, insensitive to indentation and blank lines."""
+    normalized = '\n'.join(line.strip() for line in sql.splitlines() if line.strip())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def _json_field(mapping: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """Read a JSON-shaped mapping field that may arrive as a string or a dict."""
+    value = mapping.get(key)
+    if isinstance(value, (str, bytes)):
+        # An empty string means no checks, not malformed JSON
+        return _json_loads(value) if value else {}
+    return value or {}
+
+
+def _build_test_config(
+    mapping: Dict[str, Any],
+    full_table_name: str,
+    target_table: str,
+    schema_fields: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Build the test configuration for a mapping.
+    
+    Schema columns are classified in one pass; the inferred lists are only
+    used where the mapping doesn't provide its own.
+    
+    Args:
+        mapping: Mapping configuration dictionary
+        full_table_name: Fully qualified target table name
+        target_table: Target table ID
+        schema_fields: Target table schema fields
+        
+    Returns:
+        Configuration passed to the test SQL generators
+    """
+    table_id_column = f"{target_table}_id"
+    pk_candidates = []
+    required_cols = []
+    outlier_cols = []
+    for col in schema_fields:
+        name = col['name']
+        lower_name = name.lower()
+        if lower_name in _PK_NAME_HINTS or lower_name == table_id_column:
+            pk_candidates.append(name)
+        if col['mode'] == 'REQUIRED':
+            required_cols.append(name)
+        if col['type'] in _NUMERIC_TYPES:
+            outlier_cols.append(name)
+    
+    get = mapping.get
+    return {
+        'full_table_name': full_table_name,
+        'primary_key_columns': get('primary_key_columns') or pk_candidates,
+        'required_columns': get('required_columns') or required_cols,
+        'date_columns': get('date_columns') or [],
+        'numeric_range_checks': _json_field(mapping, 'numeric_range_checks'),
+        'date_range_checks': _json_field(mapping, 'date_range_checks'),
+        'foreign_key_checks': _json_field(mapping, 'foreign_key_checks'),
+        'pattern_checks': _json_field(mapping, 'pattern_checks'),
+        'outlier_columns': get('outlier_columns') or outlier_cols
+    }
+
+
+def _predicate_batch_sql(
+    full_table_name: str,
+    predicate_tests: List[Tuple[TestTemplate, str, str]]
+) -> str:
+    """The single scan that counts the violations of several predicate tests."""
+    counts = ', '.join(
+        f"COUNTIF({predicate}) AS {test.id}"
+        for test, _, predicate in predicate_tests
+    )
+    return f"SELECT {counts} FROM `{full_table_name}`"
+
+
+def _query_batch_sql(query_tests: List[Tuple[TestTemplate, str]]) -> str:
+    """The job that counts standalone test queries: a lone query as is, else one UNION ALL."""
+    if len(query_tests) == 1:
+        return query_tests[0][1]
+    return '\nUNION ALL\n'.join(
+        f"SELECT '{test.id}' AS test_id, COUNT(*) AS c FROM ({sql})"
+        for test, sql in query_tests
+    )
+
+
+async def _gather_all(*coros: Awaitable[Any]) -> List[Any]:
+    """
+    Run coroutines concurrently in a TaskGroup and return their results in order.
+    
+    The first failure cancels the remaining tasks and is re-raised as is,
+    rather than wrapped in an ExceptionGroup.
+    """
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(coro) for coro in coros]
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0] from None
+    return [task.result() for task in tasks]
+
+
+class _RunCache:
+    """Request-scoped memoization of BigQuery lookups shared across mappings."""
+    
+    def __init__(self):
+        self._lookups: Dict[Tuple[str, str], asyncio.Future] = {}
+    
+    def memoize(self, key: Tuple[str, str], factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Return the in-flight or finished lookup for key, starting it on a miss."""
+        future = self._lookups.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_task(factory())
+            self._lookups[key] = future
+        # Other mappings share the lookup; a cancelled caller must not cancel it
+        return asyncio.shield(future)
+    
+    def close(self) -> None:
+        """Cancel unfinished lookups and drop all memoized ones; the run is over."""
+        for future in self._lookups.values():
+            future.cancel()
+        self._lookups.clear()
+
+
+class _SuggestionBatcher:
+    """
+    Run-scoped micro-batcher that groups suggestion requests into one Vertex AI call.
+    
+    Requests are flushed when max_batch are waiting or max_wait seconds after
+    the first one arrives. A failed batch falls back to per-mapping calls.
+    """
+    
+    def __init__(self, max_batch: int, max_wait: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+    
+    async def submit(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Queue one mapping's suggestion request and wait for its suggestions."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((request, future))
+        
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+    
+    def _flush(self) -> None:
+        """Send everything queued so far as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+    
+    async def _run(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """Fetch suggestions for a batch and hand each mapping its share."""
+        requests = [request for request, _ in batch]
+        try:
+            try:
+                if len(batch) == 1:
+                    results = [await vertex_ai_service.generate_test_suggestions(**requests[0])]
+                else:
+                    try:
+                        results = await vertex_ai_service.generate_test_suggestions_batch(requests)
+                        # Mappings whose batch entry couldn't be trusted are
+                        # asked for one by one
+                        retry = [idx for idx, suggestions in enumerate(results) if suggestions is None]
+                        if retry:
+                            logger.warning(f"Batched AI suggestions unusable for {len(retry)} mapping(s), requesting individually")
+                            retried = await asyncio.gather(*[
+                                vertex_ai_service.generate_test_suggestions(**requests[idx])
+                                for idx in retry
+                            ])
+                            for idx, suggestions in zip(retry, retried):
+                                results[idx] = suggestions
+                    except Exception as e:
+                        if not vertex_ai_service.should_suggest():
+                            # The failure opened the circuit breaker; don't
+                            # retry every mapping against a model that is down
+                            logger.warning(f"Batched AI suggestions failed, skipping suggestions: {str(e)}")
+                            results = [[] for _ in requests]
+                        else:
+                            logger.warning(f"Batched AI suggestions failed, requesting per mapping: {str(e)}")
+                            results = await asyncio.gather(*[
+                                vertex_ai_service.generate_test_suggestions(**request)
+                                for request in requests
+                            ])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            
+            for (_, future), suggestions in zip(batch, results):
+                if not future.done():
+                    future.set_result(suggestions)
+        finally:
+            # A cancelled batch must not leave its mappings waiting forever
+            for _, future in batch:
+                future.cancel()
+    
+    def close(self) -> None:
+        """Cancel queued requests and batches still waiting on the model."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, future in self._pending:
+            future.cancel()
+        self._pending = []
+        for task in self._flushes:
+            task.cancel()
+
+
+def add_to_summary(summary: Counter, result: MappingResult) -> None:
+    """Add one mapping's results to a running config-table summary."""
+    status_counts = Counter(t.status for t in result.predefined_results)
+    summary['total_mappings'] += 1
+    summary['total_tests'] += len(result.predefined_results)
+    summary['passed'] += status_counts['PASS']
+    summary['failed'] += status_counts['FAIL']
+    summary['errors'] += status_counts['ERROR']
+    summary['skipped'] += status_counts['SKIPPED']
+    summary['total_suggestions'] += len(result.ai_suggestions)
+
 
 class TestExecutor:
     """Service for executing tests on data mappings."""
     
+    def __init__(self):
+        """Initialize test executor."""
+        # Shared cap on in-flight BigQuery calls so large runs queue
+        # instead of tripping the project's concurrent-query quota
+        self._bq_sem = asyncio.Semaphore(settings.bq_max_concurrency)
+        # Opt-in reuse of read-only test query results across runs
+        self._result_cache = TTLCache(settings.query_result_cache_ttl)
+    
+    async def _limited(self, coro: Awaitable[Any]) -> Any:
+        """Await a BigQuery call under the shared concurrency limit."""
+        async with self._bq_sem:
+            return await coro
+    
     async def process_mapping(
         self,
         project_id: str,
-        mapping: Dict[str, Any]
+        mapping: Dict[str, Any],
+        run_cache: Optional[_RunCache] = None,
+        on_result: Optional[Callable[[TestResult], Awaitable[None]]] = None,
+        suggestion_batcher: Optional[_SuggestionBatcher] = None
     ) -> MappingResult:
         """
         Process a single mapping with predefined tests and AI suggestions.
@@ -26,11 +338,18 @@ class TestExecutor:
         Args:
             project_id: Google Cloud project ID
             mapping: Mapping configuration dictionary
+            run_cache: Lookups shared with other mappings of the same run
+            on_result: Optional callback invoked with each TestResult as it completes
+            suggestion_batcher: Groups this run's suggestion requests into shared model calls
             
         Returns:
             MappingResult with test results and suggestions
         """
         mapping_id = mapping.get('mapping_id', 'unknown')
+        # Child tasks started below; cancelled if this mapping fails or is
+        # cancelled before awaiting them, so no Vertex AI or BigQuery work
+        # is left running orphaned
+        started: List[asyncio.Task] = []
         
         try:
             # Extract mapping configuration
@@ -38,6 +357,10 @@ class TestExecutor:
             source_file_path = mapping['source_file_path']
             target_dataset = mapping['target_dataset']
             target_table = mapping['target_table']
+            get = mapping.get
+            enabled_test_ids = get('enabled_test_ids') or []
+            auto_suggest = get('auto_suggest', True)
+            cost_guard_usd = get('cost_guard_usd')
             
             full_table_name = f"{project_id}.{target_dataset}.{target_table}"
             
@@ -46,126 +369,135 @@ class TestExecutor:
             actual_file_path = matching_files[0]
             logger.info(f"Resolved {source_file_path} to {actual_file_path}. Found {len(matching_files)} matching files.")
             
-            # Get GCS file info
-            file_row_count = await gcs_service.count_csv_rows(source_bucket, actual_file_path)
+            # Get enabled tests (an empty list selects the global tests)
+            enabled_tests = get_enabled_tests(enabled_test_ids)
             
-            # Get BigQuery table info
-            bq_row_count = await bigquery_service.get_row_count(full_table_name)
-            table_metadata = await bigquery_service.get_table_metadata(project_id, target_dataset, target_table)
+            # Fetch the GCS and BigQuery info concurrently; neither depends
+            # on the other, and a failure cancels the rest. Counting the
+            # file scans all of it, so only do it when the row count test
+            # will use the result.
+            table_lookup = self._get_table_info(
+                project_id, target_dataset, target_table, full_table_name, run_cache
+            )
+            file_row_count = None
+            if any(test.id == 'row_count_match' for test in enabled_tests):
+                file_row_count, (bq_row_count, table_metadata) = await _gather_all(
+                    gcs_service.count_csv_rows(source_bucket, actual_file_path),
+                    table_lookup
+                )
+            else:
+                bq_row_count, table_metadata = await table_lookup
             
             # Prepare test configuration
-            test_config = {
-                'full_table_name': full_table_name,
-                'primary_key_columns': mapping.get('primary_key_columns', []) or [
-                    col['name'] for col in table_metadata['schema']['fields'] 
-                    if col['name'].lower() in ['id', 'key', 'uuid', 'guid', f"{target_table}_id"]
-                ],
-                'required_columns': mapping.get('required_columns', []) or [
-                    col['name'] for col in table_metadata['schema']['fields']
-                    if col['mode'] == 'REQUIRED'
-                ],
-                'date_columns': mapping.get('date_columns', []),
-                'numeric_range_checks': json.loads(mapping.get('numeric_range_checks', '{}')) if isinstance(mapping.get('numeric_range_checks'), str) else mapping.get('numeric_range_checks', {}),
-                'date_range_checks': json.loads(mapping.get('date_range_checks', '{}')) if isinstance(mapping.get('date_range_checks'), str) else mapping.get('date_range_checks', {}),
-                'foreign_key_checks': json.loads(mapping.get('foreign_key_checks', '{}')) if isinstance(mapping.get('foreign_key_checks'), str) else mapping.get('foreign_key_checks', {}),
-                'pattern_checks': json.loads(mapping.get('pattern_checks', '{}')) if isinstance(mapping.get('pattern_checks'), str) else mapping.get('pattern_checks', {}),
-                'outlier_columns': mapping.get('outlier_columns', []) or [
-                    col['name'] for col in table_metadata['schema']['fields']
-                    if col['type'] in ['INTEGER', 'FLOAT', 'NUMERIC', 'BIGNUMERIC']
-                ]
-            }
+            test_config = _build_test_config(
+                mapping, full_table_name, target_table, table_metadata['schema']['fields']
+            )
             
-            # Get enabled tests
-            enabled_test_ids = mapping.get('enabled_test_ids', [])
-            if not enabled_test_ids and not mapping.get('enabled_test_ids'):
-                 # If explicit list is empty/None, default to these for Single File mode inference
-                 # However, get_enabled_tests(None) returns Globals.
-                 # uniqueness check is Global.
-                 pass
-            enabled_tests = get_enabled_tests(enabled_test_ids)
+            # Start AI suggestions now so the model call overlaps with the
+            # predefined tests instead of running after them
+            ai_task = None
+            if auto_suggest and vertex_ai_service.should_suggest():
+                ai_task = asyncio.create_task(self._generate_ai_suggestions(
+                    mapping_id=mapping_id,
+                    source_bucket=source_bucket,
+                    source_file_path=actual_file_path,
+                    full_table_name=full_table_name,
+                    bq_schema=table_metadata['schema'],
+                    enabled_tests=enabled_tests,
+                    suggestion_batcher=suggestion_batcher
+                ))
+                started.append(ai_task)
             
             # Execute predefined tests
             predefined_results = []
             
-            # Row count test (always run first)
-            predefined_results.append(TestResult(
-                test_id='row_count_match',
-                test_name='Row Count Match',
-                category='completeness',
-                description=f"GCS file: {file_row_count} rows, BigQuery: {bq_row_count} rows",
-                status='PASS' if file_row_count == bq_row_count else 'FAIL',
-                severity='HIGH',
-                sql_query='',
-                rows_affected=abs(file_row_count - bq_row_count),
-                error_message=f"Row count mismatch: {abs(file_row_count - bq_row_count)} rows difference" if file_row_count != bq_row_count else None
-            ))
+            # Row count test (run first when enabled). Results built from our
+            # own templates are trusted, so they skip pydantic validation.
+            if file_row_count is not None:
+                row_diff = abs(file_row_count - bq_row_count)
+                predefined_results.append(TestResult.model_construct(
+                    test_id='row_count_match',
+                    test_name='Row Count Match',
+                    category='completeness',
+                    description=f"GCS file: {file_row_count} rows, BigQuery: {bq_row_count} rows",
+                    status='PASS' if row_diff == 0 else 'FAIL',
+                    severity='HIGH',
+                    sql_query='',
+                    rows_affected=row_diff,
+                    error_message=f"Row count mismatch: {row_diff} rows difference" if row_diff else None
+                ))
+                if on_result:
+                    await on_result(predefined_results[-1])
             
-            # Run other enabled tests
+            # Run other enabled tests. Single-table predicate checks are
+            # counted together in one scan; the rest are counted together in one job.
+            predicate_tests = []
+            query_tests = []
+            config_key = _config_key(test_config)
             for test in enabled_tests:
                 if test.id == 'row_count_match':
                     continue  # Already done
                 
-                sql = test.generate_sql(test_config)
+                sql, predicate = self._generate_test_sql(test, test_config, config_key)
                 if not sql:
                     continue  # Skip if no SQL (test not applicable)
                 
-                try:
-                    rows = await bigquery_service.execute_query(sql)
-                    row_count = len(rows)
-                    
-                    predefined_results.append(TestResult(
-                        test_id=test.id,
-                        test_name=test.name,
-                        category=test.category,
-                        description=test.description,
-                        status='PASS' if row_count == 0 else 'FAIL',
-                        severity=test.severity,
-                        sql_query=sql,
-                        rows_affected=row_count,
-                        error_message=None
-                    ))
-                except Exception as e:
-                    predefined_results.append(TestResult(
-                        test_id=test.id,
-                        test_name=test.name,
-                        category=test.category,
-                        description=test.description,
-                        status='ERROR',
-                        severity=test.severity,
-                        sql_query=sql,
-                        rows_affected=0,
-                        error_message=str(e)
-                    ))
+                if predicate:
+                    predicate_tests.append((test, sql, predicate))
+                else:
+                    query_tests.append((test, sql))
             
-            # Generate AI suggestions if enabled
-            ai_suggestions = []
-            if mapping.get('auto_suggest', True):
-                try:
-                    gcs_sample = await gcs_service.sample_csv_data(source_bucket, actual_file_path, 5)
-                    bq_sample = await bigquery_service.get_sample_data(full_table_name, 5)
-                    
-                    existing_test_names = [test.name for test in enabled_tests]
-                    
-                    suggestions = await vertex_ai_service.generate_test_suggestions(
-                        mapping_id=mapping_id,
-                        source_info=f"gs://{source_bucket}/{actual_file_path}",
-                        target_table=full_table_name,
-                        bq_schema=table_metadata['schema'],
-                        gcs_sample=gcs_sample,
-                        bq_sample=bq_sample,
-                        existing_tests=existing_test_names
-                    )
-                    
-                    ai_suggestions = [
-                        AISuggestion(**suggestion)
-                        for suggestion in suggestions
-                    ]
-                except Exception as e:
-                    logger.error(f"Failed to generate AI suggestions for {mapping_id}: {str(e)}")
+            # Every predefined test reports violating rows of the target
+            # table, so an empty table passes them all without a query
+            if bq_row_count == 0:
+                for test, sql, *_ in (*query_tests, *predicate_tests):
+                    predefined_results.append(self._count_result(test, sql, 0))
+                    if on_result:
+                        await on_result(predefined_results[-1])
+                query_tests = predicate_tests = []
+            
+            # Optionally skip tests whose query jobs would take the mapping's
+            # dry-run cost estimate over its guard
+            if cost_guard_usd is not None and (query_tests or predicate_tests):
+                query_tests, predicate_tests, skipped = await self._apply_cost_guard(
+                    full_table_name, query_tests, predicate_tests, float(cost_guard_usd)
+                )
+                for test_result in skipped:
+                    predefined_results.append(test_result)
+                    if on_result:
+                        await on_result(test_result)
+            
+            # Run the predicate scan and the fused standalone queries
+            # concurrently and report results as soon as each job finishes
+            pending = []
+            if query_tests:
+                pending.append(asyncio.create_task(
+                    self._run_query_tests(query_tests, run_cache)
+                ))
+            if predicate_tests:
+                pending.append(asyncio.create_task(
+                    self._run_predicate_tests(full_table_name, predicate_tests, run_cache)
+                ))
+            started.extend(pending)
+            
+            errored = 0
+            for next_done in asyncio.as_completed(pending):
+                for test_result in await next_done:
+                    predefined_results.append(test_result)
+                    errored += test_result.status == 'ERROR'
+                    if on_result:
+                        await on_result(test_result)
+            if errored:
+                logger.warning(f"{errored} test(s) errored for mapping {mapping_id}")
+            
+            # Collect AI suggestions started alongside the predefined tests
+            ai_suggestions = await ai_task if ai_task else []
             
-            return MappingResult(
+            # Built from values computed above (suggestions are validated
+            # on their own), so pydantic validation is bypassed
+            return MappingResult.model_construct(
                 mapping_id=mapping_id,
-                mapping_info=MappingInfo(
+                mapping_info=MappingInfo.model_construct(
                     source=f"gs://{source_bucket}/{actual_file_path}",
                     target=full_table_name,
                     file_row_count=file_row_count,
@@ -176,13 +508,343 @@ class TestExecutor:
             )
             
         except Exception as e:
-            logger.error(f"Error processing mapping {mapping_id}: {str(e)}")
-            return MappingResult(
+            logger.exception(f"Error processing mapping {mapping_id}")
+            return MappingResult.model_construct(
                 mapping_id=mapping_id,
                 predefined_results=[],
                 ai_suggestions=[],
-                error=str(e)
+                error=_error_text(e)
             )
+        finally:
+            for task in started:
+                task.cancel()
+    
+    async def _generate_ai_suggestions(
+        self,
+        mapping_id: str,
+        source_bucket: str,
+        source_file_path: str,
+        full_table_name: str,
+        bq_schema: Dict[str, Any],
+        enabled_tests: List[TestTemplate],
+        suggestion_batcher: Optional[_SuggestionBatcher] = None
+    ) -> List[AISuggestion]:
+        """
+        Sample source and target data and ask Vertex AI for extra tests.
+        
+        Failures are logged and yield no suggestions.
+        """
+        try:
+            gcs_sample, bq_sample = await _gather_all(
+                gcs_service.sample_csv_data(source_bucket, source_file_path, 5),
+                self._limited(bigquery_service.get_sample_data(full_table_name, 5))
+            )
+            
+            request = dict(
+                mapping_id=mapping_id,
+                source_info=f"gs://{source_bucket}/{source_file_path}",
+                target_table=full_table_name,
+                bq_schema=bq_schema,
+                gcs_sample=gcs_sample,
+                bq_sample=bq_sample,
+                existing_tests=[test.name for test in enabled_tests]
+            )
+            if suggestion_batcher is not None:
+                suggestions = await suggestion_batcher.submit(request)
+            else:
+                suggestions = await vertex_ai_service.generate_test_suggestions(**request)
+            
+            return [
+                AISuggestion(**suggestion)
+                for suggestion in suggestions
+            ]
+        except Exception as e:
+            logger.error(f"Failed to generate AI suggestions for {mapping_id}: {str(e)}")
+            return []
+    
+    def _generate_test_sql(
+        self,
+        test: TestTemplate,
+        test_config: Dict[str, Any],
+        config_key: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Generate a test's SQL and predicate, reusing output for an identical config."""
+        if PREDEFINED_TESTS.get(test.id) is not test:
+            return _render_test_sql(test, test_config)
+        return _cached_test_sql(test.id, config_key or _config_key(test_config))
+    
+    async def _get_table_info(
+        self,
+        project_id: str,
+        dataset_id: str,
+        table_id: str,
+        full_table_name: str,
+        run_cache: Optional[_RunCache] = None
+    ) -> Tuple[int, Dict[str, Any]]:
+        """
+        Get a target table's row count and metadata with one metadata fetch.
+        
+        The row count must be current, so metadata is refreshed once per
+        run rather than served from the cross-request cache.
+        """
+        table_metadata = await self._get_table_metadata(project_id, dataset_id, table_id, run_cache)
+        row_count = await self._get_row_count(full_table_name, table_metadata, run_cache)
+        return row_count, table_metadata
+    
+    async def _get_table_metadata(
+        self,
+        project_id: str,
+        dataset_id: str,
+        table_id: str,
+        run_cache: Optional[_RunCache] = None
+    ) -> Dict[str, Any]:
+        """Get current table metadata, reusing a lookup already made in this run."""
+        def fetch() -> Awaitable[Dict[str, Any]]:
+            return self._limited(bigquery_service.get_table_metadata(
+                project_id, dataset_id, table_id, refresh=True
+            ))
+        
+        if run_cache is None:
+            return await fetch()
+        return await run_cache.memoize(('metadata', f"{project_id}.{dataset_id}.{table_id}"), fetch)
+    
+    async def _get_row_count(
+        self,
+        full_table_name: str,
+        table_metadata: Dict[str, Any],
+        run_cache: Optional[_RunCache] = None
+    ) -> int:
+        """Get a table row count, reusing a count already made in this run."""
+        if run_cache is None:
+            return await self._limited(bigquery_service.get_row_count(full_table_name, table_metadata))
+        return await run_cache.memoize(
+            ('row_count', full_table_name),
+            lambda: self._limited(bigquery_service.get_row_count(full_table_name, table_metadata))
+        )
+    
+    async def _get_query_count(
+        self,
+        sql: str,
+        run_cache: Optional[_RunCache] = None
+    ) -> int:
+        """Count a query's rows, reusing the count for identical SQL in this run."""
+        return await self._cached_query(
+            'query_count', sql, bigquery_service.execute_query_count, run_cache
+        )
+    
+    async def _cached_query(
+        self,
+        kind: str,
+        sql: str,
+        fetch: Callable[[str], Awaitable[Any]],
+        run_cache: Optional[_RunCache] = None
+    ) -> Any:
+        """
+        Run a test query through the run cache and the cross-run result cache.
+        
+        Args:
+            kind: Namespace for the run-cache key
+            sql: Query to run
+            fetch: bigquery_service method that runs the query
+            run_cache: Lookups shared with other mappings of the same run
+            
+        Returns:
+            Whatever fetch returns for the query
+        """
+        async def compute() -> Any:
+            if self._result_cache.ttl <= 0 or _VOLATILE_SQL.search(sql):
+                return await self._limited(fetch(sql))
+            return await self._result_cache.get_or_set(
+                (kind, _result_key(sql)), lambda: self._limited(fetch(sql))
+            )
+        
+        if run_cache is None:
+            return await compute()
+        return await run_cache.memoize((kind, _sql_key(sql)), compute)
+    
+    async def _run_query_test(
+        self,
+        test: TestTemplate,
+        sql: str,
+        run_cache: Optional[_RunCache] = None
+    ) -> TestResult:
+        """Run a single test query and report the rows it returns as failures."""
+        try:
+            row_count = await self._get_query_count(sql, run_cache)
+            return self._count_result(test, sql, row_count)
+        except Exception as e:
+            return TestResult.model_construct(
+                test_id=test.id,
+                test_name=test.name,
+                category=test.category,
+                description=test.description,
+                status='ERROR',
+                severity=test.severity,
+                sql_query=sql,
+                rows_affected=0,
+                error_message=_error_text(e)
+            )
+    
+    async def _run_predicate_tests(
+        self,
+        full_table_name: str,
+        predicate_tests: List[Tuple[TestTemplate, str, str]],
+        run_cache: Optional[_RunCache] = None
+    ) -> List[TestResult]:
+        """
+        Count violations for several predicate tests with a single scan.
+        
+        Args:
+            full_table_name: Fully qualified target table name
+            predicate_tests: (test, sql, predicate) tuples for the target table
+            run_cache: Lookups shared with other mappings of the same run
+            
+        Returns:
+            One TestResult per test, in input order
+        """
+        batch_sql = _predicate_batch_sql(full_table_name, predicate_tests)
+        
+        try:
+            rows = await self._cached_query(
+                'query_rows', batch_sql, bigquery_service.execute_query, run_cache
+            )
+            row = rows[0]
+        except Exception as e:
+            # One bad predicate fails the whole batch; rerun individually so
+            # only the offending test reports an error.
+            logger.warning(f"Batched test query failed for {full_table_name}, running tests individually: {str(e)}")
+            return [await self._run_query_test(test, sql, run_cache) for test, sql, _ in predicate_tests]
+        
+        # Each test's SQL returns at most VIOLATION_ROW_LIMIT rows, which is
+        # what the individual fallback counts; cap the scan's counts to match
+        return [
+            self._count_result(test, sql, min(int(row[test.id] or 0), VIOLATION_ROW_LIMIT))
+            for test, sql, _ in predicate_tests
+        ]
+    
+    async def _run_query_tests(
+        self,
+        query_tests: List[Tuple[TestTemplate, str]],
+        run_cache: Optional[_RunCache] = None
+    ) -> List[TestResult]:
+        """
+        Count the rows of several standalone test queries in one job.
+        
+        Args:
+            query_tests: (test, sql) tuples
+            run_cache: Lookups shared with other mappings of the same run
+            
+        Returns:
+            One TestResult per test, in input order
+        """
+        if len(query_tests) == 1:
+            test, sql = query_tests[0]
+            return [await self._run_query_test(test, sql, run_cache)]
+        
+        batch_sql = _query_batch_sql(query_tests)
+        
+        try:
+            rows = await self._cached_query(
+                'query_rows', batch_sql, bigquery_service.execute_query, run_cache
+            )
+            counts = {row['test_id']: int(row['c']) for row in rows}
+        except Exception as e:
+            # A query that fails to compile fails the whole job; rerun
+            # individually so only the offending test reports an error.
+            logger.warning(f"Batched test queries failed, running tests individually: {str(e)}")
+            return [await self._run_query_test(test, sql, run_cache) for test, sql in query_tests]
+        
+        return [
+            self._count_result(test, sql, counts[test.id])
+            for test, sql in query_tests
+        ]
+    
+    async def _apply_cost_guard(
+        self,
+        full_table_name: str,
+        query_tests: List[Tuple[TestTemplate, str]],
+        predicate_tests: List[Tuple[TestTemplate, str, str]],
+        threshold_usd: float
+    ) -> Tuple[List[Tuple[TestTemplate, str]], List[Tuple[TestTemplate, str, str]], List[TestResult]]:
+        """
+        Dry-run the query jobs the tests will run and hold back those over threshold_usd.
+        
+        The predicate tests run as one fused scan and the standalone tests as
+        one fused job, so those jobs are estimated rather than each test's
+        own SQL, which would count a shared scan once per test. The cheapest
+        jobs are kept while their total estimate fits the guard.
+        
+        Args:
+            full_table_name: Fully qualified target table name
+            query_tests: (test, sql) tuples
+            predicate_tests: (test, sql, predicate) tuples
+            threshold_usd: Maximum estimated on-demand cost of the mapping's test queries
+            
+        Returns:
+            The affordable query tests, the affordable predicate tests, and
+            SKIPPED results for the rest
+        """
+        jobs = []
+        if query_tests:
+            jobs.append((_query_batch_sql(query_tests), query_tests))
+        if predicate_tests:
+            jobs.append((_predicate_batch_sql(full_table_name, predicate_tests), predicate_tests))
+        
+        estimates = await asyncio.gather(
+            *[self._limited(bigquery_service.dry_run(sql)) for sql, _ in jobs],
+            return_exceptions=True
+        )
+        # A failed dry run means a query is invalid; let it run and report
+        # its own error
+        costs = [
+            0.0 if isinstance(bytes_processed, Exception)
+            else bytes_processed / _BYTES_PER_TIB * settings.bq_price_per_tib_usd
+            for bytes_processed in estimates
+        ]
+        
+        total = 0.0
+        skipped = []
+        over_budget = set()
+        for cost, (_, tests) in sorted(zip(costs, jobs), key=lambda job: job[0]):
+            if total + cost <= threshold_usd:
+                total += cost
+                continue
+            for test, sql, *_ in tests:
+                over_budget.add(test.id)
+                skipped.append(TestResult.model_construct(
+                    test_id=test.id,
+                    test_name=test.name,
+                    category=test.category,
+                    description=test.description,
+                    status='SKIPPED',
+                    severity=test.severity,
+                    sql_query=sql,
+                    rows_affected=0,
+                    error_message=(
+                        f"Estimated ${total + cost:.2f} for this mapping's test queries "
+                        f"exceeds cost guard of ${threshold_usd:.2f}"
+                    )
+                ))
+        
+        return (
+            [entry for entry in query_tests if entry[0].id not in over_budget],
+            [entry for entry in predicate_tests if entry[0].id not in over_budget],
+            skipped
+        )
+    
+    def _count_result(self, test: TestTemplate, sql: str, row_count: int) -> TestResult:
+        """Build the result of a test that passes when no rows violate it."""
+        return TestResult.model_construct(
+            test_id=test.id,
+            test_name=test.name,
+            category=test.category,
+            description=test.description,
+            status='PASS' if row_count == 0 else 'FAIL',
+            severity=test.severity,
+            sql_query=sql,
+            rows_affected=row_count,
+            error_message=None
+        )
     
     async def process_config_table(
         self,
@@ -202,44 +864,27 @@ class TestExecutor:
             Dictionary with summary and results by mapping
         """
         try:
-            # Read config table
-            mappings = await bigquery_service.read_config_table(
+            # Collect in completion order, then restore config table order
+            indexed = [item async for item in self._iter_config_table(
                 project_id, config_dataset, config_table
-            )
-            
-            if not mappings:
-                raise ValueError("No active mappings found in config table")
+            )]
+            indexed.sort(key=lambda item: item[0])
+            results = [result for _, result in indexed]
             
-            # Process each mapping
-            results = []
-            for mapping in mappings:
-                result = await self.process_mapping(project_id, mapping)
-                results.append(result)
-            
-            # Calculate summary
-            total_tests = sum(len(r.predefined_results) for r in results)
-            passed = sum(
-                len([t for t in r.predefined_results if t.status == 'PASS'])
-                for r in results
-            )
-            failed = sum(
-                len([t for t in r.predefined_results if t.status == 'FAIL'])
-                for r in results
-            )
-            errors = sum(
-                len([t for t in r.predefined_results if t.status == 'ERROR'])
-                for r in results
-            )
-            total_suggestions = sum(len(r.ai_suggestions) for r in results)
+            # Calculate summary in a single pass over the results
+            summary = Counter()
+            for r in results:
+                add_to_summary(summary, r)
             
             return {
                 'summary': {
-                    'total_mappings': len(results),
-                    'total_tests': total_tests,
-                    'passed': passed,
-                    'failed': failed,
-                    'errors': errors,
-                    'total_suggestions': total_suggestions
+                    'total_mappings': summary['total_mappings'],
+                    'total_tests': summary['total_tests'],
+                    'passed': summary['passed'],
+                    'failed': summary['failed'],
+                    'errors': summary['errors'],
+                    'skipped': summary['skipped'],
+                    'total_suggestions': summary['total_suggestions']
                 },
                 'results_by_mapping': results
             }
@@ -248,6 +893,90 @@ class TestExecutor:
             logger.error(f"Error processing config table: {str(e)}")
             raise
 
+    async def process_config_table_streaming(
+        self,
+        project_id: str,
+        config_dataset: str,
+        config_table: str
+    ) -> AsyncIterator[MappingResult]:
+        """
+        Process all mappings from a config table, yielding each result as it completes.
+        
+        Unlike process_config_table, finished results are not held until
+        the whole run ends, so memory stays bounded by the mappings in flight.
+        
+        Args:
+            project_id: Google Cloud project ID
+            config_dataset: Config table dataset
+            config_table: Config table name
+            
+        Yields:
+            MappingResult per mapping, in completion order
+        """
+        async for _, result in self._iter_config_table(project_id, config_dataset, config_table):
+            yield result
+
+    async def _iter_config_table(
+        self,
+        project_id: str,
+        config_dataset: str,
+        config_table: str
+    ) -> AsyncIterator[Tuple[int, MappingResult]]:
+        """Run a config table's mappings, yielding (config index, result) as each completes."""
+        # Read config table
+        mappings = await bigquery_service.read_config_table(
+            project_id, config_dataset, config_table
+        )
+        
+        if not mappings:
+            raise ValueError("No active mappings found in config table")
+        
+        # Process mappings concurrently (bounded so a large config table
+        # doesn't flood GCS/BigQuery), sharing metadata and row-count
+        # lookups between mappings that hit the same tables
+        run_cache = _RunCache()
+        # Mappings in flight together share Vertex AI suggestion calls
+        suggestion_batcher = _SuggestionBatcher(
+            settings.vertex_ai_suggestion_batch_size,
+            settings.vertex_ai_suggestion_batch_wait_seconds
+        )
+        
+        async def indexed(idx: int, mapping: Dict[str, Any]) -> Tuple[int, MappingResult]:
+            return idx, await self.process_mapping(
+                project_id, mapping, run_cache,
+                suggestion_batcher=suggestion_batcher
+            )
+        
+        # Tasks are started as slots free up and dropped once yielded, so
+        # only the mappings in flight (and their results) are held
+        queued = iter(enumerate(mappings))
+        pending = set()
+        
+        def fill() -> None:
+            for idx, mapping in itertools.islice(queued, settings.max_concurrent_mappings - len(pending)):
+                pending.add(asyncio.create_task(indexed(idx, mapping)))
+        
+        try:
+            fill()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                fill()
+                for task in done:
+                    yield task.result()
+        finally:
+            # A consumer that stops early (e.g. a dropped stream) cancels
+            # the mappings still running, which cancel their own tests and
+            # suggestion requests, plus the shared lookups and suggestion
+            # batches. Calls not yet started never run; a BigQuery call
+            # already in a worker thread finishes, and its result is dropped.
+            for task in pending:
+                task.cancel()
+            run_cache.close()
+            suggestion_batcher.close()
+        
+        if self._result_cache.ttl > 0:
+            logger.info(f"Query result cache hit rate: {self._result_cache.hit_rate:.0%}")
+
 
     async def process_schema_validation(
         self,
@@ -268,19 +997,32 @@ class TestExecutor:
         """
         all_schemas = {}
         
-        # 1. Gather all schemas
-        for dataset_id in datasets:
-            try:
-                table_ids = await bigquery_service.get_tables_in_dataset(project_id, dataset_id)
-                for table_id in table_ids:
-                    try:
-                        full_name = f"{project_id}.{dataset_id}.{table_id}"
-                        metadata = await bigquery_service.get_table_metadata(project_id, dataset_id, table_id)
-                        all_schemas[full_name] = metadata['schema']
-                    except Exception as e:
-                        logger.warning(f"Skipping table {table_id}: {str(e)}")
-            except Exception as e:
-                logger.error(f"Error listing tables for {dataset_id}: {str(e)}")
+        # 1. Gather all schemas, listing datasets and fetching table
+        # metadata concurrently under the shared BigQuery limit
+        dataset_tables = await asyncio.gather(
+            *[self._limited(bigquery_service.get_tables_in_dataset(project_id, dataset_id))
+              for dataset_id in datasets],
+            return_exceptions=True
+        )
+        
+        pairs = []
+        for dataset_id, table_ids in zip(datasets, dataset_tables):
+            if isinstance(table_ids, Exception):
+                logger.error(f"Error listing tables for {dataset_id}: {str(table_ids)}")
+                continue
+            pairs.extend((dataset_id, table_id) for table_id in table_ids)
+        
+        metas = await asyncio.gather(
+            *[self._limited(bigquery_service.get_table_metadata(project_id, dataset_id, table_id))
+              for dataset_id, table_id in pairs],
+            return_exceptions=True
+        )
+        
+        for (dataset_id, table_id), metadata in zip(pairs, metas):
+            if isinstance(metadata, Exception):
+                logger.warning(f"Skipping table {table_id}: {str(metadata)}")
+                continue
+            all_schemas[f"{project_id}.{dataset_id}.{table_id}"] = metadata['schema']
         
         if not all_schemas:
             logger.warning("No schemas found to validate.")
@@ -0,0 +1,106 @@
+"""In-memory TTL cache with LRU eviction."""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Cache of values that expire after a time-to-live, evicting least recently used."""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds an entry stays fresh; 0 disables caching
+            maxsize: Maximum number of entries kept
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        # One lock per key being computed, so concurrent misses share a fetch
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the fresh value for key, or None."""
+        value = self._fresh(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _fresh(self, key: Hashable) -> Optional[Any]:
+        """Return the unexpired value for key, or None, without counting the lookup."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value for key, evicting the oldest entry when full."""
+        if self.ttl <= 0:
+            return
+
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get_or_set(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss.
+
+        Concurrent misses for the same key wait for the first caller's
+        result instead of each calling factory.
+        """
+        value = self.get(key)
+        if value is not None or self.ttl <= 0:
+            return value if value is not None else await factory()
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                value = self._fresh(key)
+                if value is None:
+                    value = await factory()
+                    self.set(key, value)
+                return value
+        finally:
+            if not lock.locked():
+                self._locks.pop(key, None)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop the entry for key, if any."""
+        self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Drop every entry whose key satisfies predicate."""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def invalidate_pattern(self, pattern: str) -> None:
+        """Drop every entry whose key, as a string, matches a regex."""
+        regex = re.compile(pattern)
+        self.invalidate_where(lambda key: regex.search(str(key)) is not None)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._entries.clear()
@@ -1,29 +1,88 @@
 """Vertex AI service for AI-powered test generation."""
+import asyncio
 import json
-from typing import List, Dict, Any
-from google.cloud import aiplatform
-from vertexai.generative_models import GenerativeModel
-import vertexai
+import time
+from collections import Counter
+from typing import List, Dict, Any, Optional
 
 from app.config import settings
 
 
+def _match_batch_entries(
+    entries: List[Any],
+    requests: List[Dict[str, Any]]
+) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Assign a batch response's entries to the mappings they answer.
+
+    The model's mapping_idx is only trusted when it is in range, used once,
+    and every suggestion's SQL queries that mapping's target table, so a
+    1-based or shuffled answer can't hand one mapping another's tests.
+    """
+    counts = Counter(
+        entry.get('mapping_idx') for entry in entries
+        if isinstance(entry, dict) and type(entry.get('mapping_idx')) is int
+    )
+    matched: List[Optional[List[Dict[str, Any]]]] = [None] * len(requests)
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        idx = entry.get('mapping_idx')
+        suggestions = entry.get('suggestions')
+        if (
+            type(idx) is not int or not 0 <= idx < len(requests) or counts[idx] > 1
+            or not isinstance(suggestions, list)
+        ):
+            continue
+        target_table = requests[idx]['target_table']
+        if all(
+            isinstance(suggestion, dict) and target_table in str(suggestion.get('sql_query', ''))
+            for suggestion in suggestions
+        ):
+            matched[idx] = suggestions
+    return matched
+
+
 class VertexAIService:
     """Service for Vertex AI operations."""
     
     def __init__(self):
         """Initialize Vertex AI service."""
         self.model = None
+        # Circuit breaker: after repeated suggestion failures, stop asking
+        # (and stop callers from sampling data for it) until a cooldown ends
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
 
     def _ensure_model(self):
         """Ensure model is initialized."""
         if not self.model:
+            # The SDK import is slow; defer it until a model call is needed so
+            # startup and runs without suggestions don't pay for it
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+            
             vertexai.init(
                 project=settings.google_cloud_project,
                 location=settings.vertex_ai_location
             )
             self.model = GenerativeModel(settings.vertex_ai_model)
     
+    def should_suggest(self) -> bool:
+        """Whether suggestions should be requested (circuit breaker not open)."""
+        return time.monotonic() >= self._circuit_open_until
+    
+    def _record_suggestion_outcome(self, succeeded: bool) -> None:
+        """Update the circuit breaker after a suggestion request."""
+        if succeeded:
+            self._consecutive_failures = 0
+            return
+        
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= settings.vertex_ai_failure_threshold:
+            self._circuit_open_until = time.monotonic() + settings.vertex_ai_cooldown_seconds
+            self._consecutive_failures = 0
+    
     async def generate_test_suggestions(
         self,
         mapping_id: str,
@@ -84,7 +143,7 @@ Return ONLY a JSON array of 3-5 suggestions. No markdown formatting.
         
         try:
             self._ensure_model()
-            response = self.model.generate_content(prompt)
+            response = await asyncio.to_thread(self.model.generate_content, prompt)
             text = response.text
             
             # Clean up markdown formatting if present
@@ -93,12 +152,94 @@ Return ONLY a JSON array of 3-5 suggestions. No markdown formatting.
             # Parse JSON
             suggestions = json.loads(text)
             
+            self._record_suggestion_outcome(True)
             return suggestions if isinstance(suggestions, list) else []
             
         except Exception as e:
             print(f"Failed to generate AI suggestions: {str(e)}")
+            self._record_suggestion_outcome(False)
             return []
 
+    async def generate_test_suggestions_batch(
+        self,
+        requests: List[Dict[str, Any]]
+    ) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        Generate AI test suggestions for several mappings with one model call.
+
+        Args:
+            requests: Keyword arguments of generate_test_suggestions, one dict per mapping
+
+        Returns:
+            List of test suggestions per mapping, in request order. None for
+            a mapping whose entry is missing, out of range, repeated or
+            queries another table; callers ask for those one by one
+
+        Raises:
+            ValueError: If the response cannot be parsed; callers fall back
+                to per-mapping calls
+        """
+        sections = "\n".join(
+            f"""
+### Mapping {idx}
+- Mapping: {req['mapping_id']}
+- Source: {req['source_info']}
+- Target: {req['target_table']}
+- Schema: {json.dumps(req['bq_schema'], indent=2)}
+- GCS Sample: {json.dumps(req['gcs_sample'][:5], indent=2, default=str)}
+- BigQuery Sample: {json.dumps(req['bq_sample'][:5], indent=2, default=str)}
+
+Predefined Tests Already Running:
+{chr(10).join(f'- {test}' for test in req['existing_tests'])}
+"""
+            for idx, req in enumerate(requests)
+        )
+
+        prompt = f"""
+You are a data quality expert analyzing several data pipelines.
+
+**Mappings:**
+{sections}
+
+**Your Task:**
+For EACH mapping, suggest 3-5 ADDITIONAL test cases that would be valuable for that specific dataset.
+Focus on:
+1. Business logic specific to this data
+2. Data patterns you observe in the samples
+3. Potential data quality issues not covered by standard tests
+
+For each suggestion, provide:
+- test_name: Clear, descriptive name
+- test_category: One of (completeness/integrity/quality/statistical/business)
+- severity: HIGH/MEDIUM/LOW
+- sql_query: Complete SQL query that returns rows that FAIL the test
+- reasoning: Why this test is important for THIS specific dataset (2-3 sentences)
+
+CRITICAL: Use each mapping's own full target table name in its SQL queries.
+
+Return ONLY a JSON array with one object per mapping, in the form
+{{"mapping_idx": <mapping number>, "suggestions": [...]}}. No markdown formatting.
+"""
+
+        try:
+            self._ensure_model()
+            response = await asyncio.to_thread(self.model.generate_content, prompt)
+            text = response.text
+
+            # Clean up markdown formatting if present
+            text = text.replace('```json\n', '').replace('```\n', '').replace('```', '').strip()
+
+            entries = json.loads(text)
+            if not isinstance(entries, list):
+                raise ValueError("Batch response is not a JSON array")
+
+        except Exception as e:
+            self._record_suggestion_outcome(False)
+            raise ValueError(f"Failed to generate batched AI suggestions: {str(e)}")
+
+        self._record_suggestion_outcome(True)
+        return _match_batch_entries(entries, requests)
+
     async def validate_schema(
         self,
         erd_description: str,
@@ -142,7 +283,7 @@ Return ONLY a JSON array of findings. No markdown.
 """
         try:
             self._ensure_model()
-            response = self.model.generate_content(prompt)
+            response = await asyncio.to_thread(self.model.generate_content, prompt)
             text = response.text
             text = text.replace('```json\\n', '').replace('```\\n', '').replace('```', '').strip()
             return json.loads(text)
@@ -151,6 +292,5 @@ Return ONLY a JSON array of findings. No markdown.
             return []
 
 
-
 # Singleton instance
 vertex_ai_service = VertexAIService()
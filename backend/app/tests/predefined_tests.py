@@ -1,10 +1,18 @@
 """Predefined test templates for data quality validation."""
-from typing import Dict, List, Callable, Optional
+import functools
+from typing import Dict, Iterable, List, Callable, Optional, Tuple
 
 
 class TestTemplate:
     """Template for a predefined test."""
     
+    # Templates are few, long-lived and read on every mapping; slots give
+    # them a fixed layout and reject stray attributes
+    __slots__ = (
+        'id', 'name', 'category', 'severity', 'description',
+        'is_global', 'generate_sql', 'generate_predicate'
+    )
+    
     def __init__(
         self,
         test_id: str,
@@ -13,7 +21,8 @@ class TestTemplate:
         severity: str,
         description: str,
         is_global: bool,
-        generate_sql: Callable[[Dict], Optional[str]]
+        generate_sql: Callable[[Dict], Optional[str]],
+        generate_predicate: Optional[Callable[[Dict], Optional[str]]] = None
     ):
         self.id = test_id
         self.name = name
@@ -22,6 +31,190 @@ class TestTemplate:
         self.description = description
         self.is_global = is_global
         self.generate_sql = generate_sql
+        # Row-level violation predicate for single-table checks, so several
+        # tests can be counted in one scan with COUNTIF. None for tests that
+        # need joins, grouping or window stats.
+        self.generate_predicate = generate_predicate
+
+
+# Rows returned by a violation query. Test results report the rows the
+# shown query returns, so single-scan counts are capped at this too.
+VIOLATION_ROW_LIMIT = 100
+
+# SQL skeletons, filled with %-formatting so only the varying parts are
+# built per config
+_VIOLATION_ROWS_SQL = """
+            SELECT %(columns)s FROM `%(table)s`
+            WHERE %(predicate)s
+            LIMIT %(limit)d
+            """
+
+_DUPLICATE_KEYS_SQL = """
+            SELECT %(keys)s, COUNT(*) as duplicate_count
+            FROM `%(table)s`
+            GROUP BY %(keys)s
+            HAVING COUNT(*) > 1
+            """
+
+_OUTLIER_SQL = """
+            WITH stats AS (
+                SELECT 
+                    AVG(%(col)s) as mean,
+                    STDDEV(%(col)s) as stddev
+                FROM `%(table)s`
+                WHERE %(col)s IS NOT NULL
+            )
+            SELECT %(columns)s 
+            FROM `%(table)s` t, stats
+            WHERE ABS(t.%(col)s - stats.mean) > 3 * stats.stddev
+            LIMIT %(limit)d
+            """
+
+
+@functools.lru_cache(maxsize=512)
+def _joined(columns: Tuple[str, ...]) -> str:
+    """Comma-separated column list; mappings share a few key sets."""
+    return ', '.join(columns)
+
+
+def _requires(*keys: str) -> Callable[[Callable[[Dict], Optional[str]]], Callable[[Dict], Optional[str]]]:
+    """
+    Make a SQL or predicate generator return None unless every key is set in the config.
+    
+    The check runs before any formatting, so tests that don't apply to a
+    mapping cost only a few dict lookups.
+    """
+    def decorator(generate: Callable[[Dict], Optional[str]]) -> Callable[[Dict], Optional[str]]:
+        @functools.wraps(generate)
+        def wrapper(config: Dict) -> Optional[str]:
+            for key in keys:
+                if not config.get(key):
+                    return None
+            return generate(config)
+        return wrapper
+    return decorator
+
+
+def _diagnostic_columns(config: Dict, checked_columns: Iterable[str], prefix: str = '') -> str:
+    """
+    Columns a violation query returns: the primary key plus the checked columns.
+    
+    BigQuery bills by the columns read, so violation queries avoid SELECT *.
+    """
+    columns = dict.fromkeys([*(config.get('primary_key_columns') or []), *checked_columns])
+    return ', '.join(f"{prefix}{col}" for col in columns)
+
+
+def _violation_rows_sql(
+    generate_predicate: Callable[[Dict], Optional[str]],
+    checked_key: str
+) -> Callable[[Dict], Optional[str]]:
+    """
+    Build a generate_sql callable that selects rows matching a violation predicate.
+    
+    checked_key names the config entry (a list or a dict keyed by column)
+    holding the columns the predicate checks.
+    """
+    @_requires('full_table_name')
+    def generate_sql(config: Dict) -> Optional[str]:
+        predicate = generate_predicate(config)
+        if not predicate:
+            return None
+        return _VIOLATION_ROWS_SQL % {
+            'table': config['full_table_name'],
+            'columns': _diagnostic_columns(config, config[checked_key]),
+            'predicate': predicate,
+            'limit': VIOLATION_ROW_LIMIT
+        }
+    return generate_sql
+
+
+@_requires('full_table_name', 'primary_key_columns')
+def _duplicate_keys_sql(config: Dict) -> Optional[str]:
+    """Primary key values that occur more than once."""
+    return _DUPLICATE_KEYS_SQL % {
+        'table': config['full_table_name'],
+        'keys': _joined(tuple(config['primary_key_columns']))
+    }
+
+
+@_requires('full_table_name', 'outlier_columns')
+def _outlier_sql(config: Dict) -> Optional[str]:
+    """Rows more than three standard deviations from the mean of the first outlier column."""
+    col = config['outlier_columns'][0]
+    return _OUTLIER_SQL % {
+        'table': config['full_table_name'],
+        'col': col,
+        'columns': _diagnostic_columns(config, [col], prefix='t.'),
+        'limit': VIOLATION_ROW_LIMIT
+    }
+
+
+@_requires('required_columns')
+def _required_nulls_predicate(config: Dict) -> Optional[str]:
+    """Rows with a NULL in any required column."""
+    return ' OR '.join(f"{col} IS NULL" for col in config['required_columns'])
+
+
+@_requires('numeric_range_checks')
+def _numeric_range_predicate(config: Dict) -> Optional[str]:
+    """Rows with a numeric value outside its configured range."""
+    return ' OR '.join(
+        f"({col} < {range_val['min']} OR {col} > {range_val['max']})"
+        for col, range_val in config['numeric_range_checks'].items()
+    )
+
+
+@_requires('date_range_checks')
+def _date_range_predicate(config: Dict) -> Optional[str]:
+    """Rows with a date outside its configured range."""
+    return ' OR '.join(
+        f"({col} < '{range_val['min_date']}' OR {col} > '{range_val['max_date']}')"
+        for col, range_val in config['date_range_checks'].items()
+    )
+
+
+@_requires('pattern_checks')
+def _pattern_predicate(config: Dict) -> Optional[str]:
+    """Rows whose value does not match its configured pattern."""
+    return ' OR '.join(
+        f"NOT REGEXP_CONTAINS(CAST({col} AS STRING), r'{pattern}')"
+        for col, pattern in config['pattern_checks'].items()
+    )
+
+
+@_requires('full_table_name', 'foreign_key_checks')
+def _referential_integrity_sql(config: Dict) -> Optional[str]:
+    """
+    Foreign key values with no matching row in the referenced table.
+    
+    The target is scanned once: each FK is LEFT JOINed to the distinct keys
+    of its reference table, then every row is unnested into one probe per
+    FK. Values are cast to STRING so FKs of different types share a column.
+    """
+    checks = list(config['foreign_key_checks'].items())
+    joins = ''.join(
+        f"""
+            LEFT JOIN (SELECT DISTINCT {ref['column']} AS ref_key FROM `{ref['table']}`) r{idx}
+                ON r{idx}.ref_key = t.{fk_col}"""
+        for idx, (fk_col, ref) in enumerate(checks)
+    )
+    probes = ','.join(
+        f"""
+                STRUCT('{fk_col}' AS fk_column, CAST(t.{fk_col} AS STRING) AS invalid_value, r{idx}.ref_key IS NULL AS missing)"""
+        for idx, (fk_col, ref) in enumerate(checks)
+    )
+    return f"""
+            SELECT 
+                fk.fk_column, 
+                fk.invalid_value,
+                COUNT(*) as occurrence_count
+            FROM `{config['full_table_name']}` t{joins}
+            CROSS JOIN UNNEST([{probes}
+            ]) fk
+            WHERE fk.invalid_value IS NOT NULL AND fk.missing
+            GROUP BY fk.fk_column, fk.invalid_value
+            """
 
 
 # Predefined test templates
@@ -43,13 +236,8 @@ PREDEFINED_TESTS = {
         severity='HIGH',
         description='Check required columns have no NULL values',
         is_global=True,
-        generate_sql=lambda config: (
-            f"""
-            SELECT * FROM `{config['full_table_name']}`
-            WHERE {' OR '.join(f"{col} IS NULL" for col in config.get('required_columns', []))}
-            LIMIT 100
-            """ if config.get('required_columns') else None
-        )
+        generate_sql=_violation_rows_sql(_required_nulls_predicate, 'required_columns'),
+        generate_predicate=_required_nulls_predicate
     ),
     
     'no_duplicates_pk': TestTemplate(
@@ -59,14 +247,7 @@ PREDEFINED_TESTS = {
         severity='HIGH',
         description='Ensure primary key uniqueness',
         is_global=True,
-        generate_sql=lambda config: (
-            f"""
-            SELECT {', '.join(config['primary_key_columns'])}, COUNT(*) as duplicate_count
-            FROM `{config['full_table_name']}`
-            GROUP BY {', '.join(config['primary_key_columns'])}
-            HAVING COUNT(*) > 1
-            """ if config.get('primary_key_columns') else None
-        )
+        generate_sql=_duplicate_keys_sql
     ),
     
     'referential_integrity': TestTemplate(
@@ -76,24 +257,7 @@ PREDEFINED_TESTS = {
         severity='HIGH',
         description='Validate foreign key relationships',
         is_global=False,
-        generate_sql=lambda config: (
-            ' UNION ALL '.join([
-                f"""
-                SELECT 
-                    '{fk_col}' as fk_column, 
-                    {fk_col} as invalid_value,
-                    COUNT(*) as occurrence_count
-                FROM `{config['full_table_name']}` t
-                WHERE {fk_col} IS NOT NULL
-                AND NOT EXISTS (
-                    SELECT 1 FROM `{ref['table']}` r
-                    WHERE r.{ref['column']} = t.{fk_col}
-                )
-                GROUP BY {fk_col}
-                """
-                for fk_col, ref in config.get('foreign_key_checks', {}).items()
-            ]) if config.get('foreign_key_checks') else None
-        )
+        generate_sql=_referential_integrity_sql
     ),
     
     'numeric_range': TestTemplate(
@@ -103,16 +267,8 @@ PREDEFINED_TESTS = {
         severity='MEDIUM',
         description='Check numeric values are within expected ranges',
         is_global=False,
-        generate_sql=lambda config: (
-            f"""
-            SELECT * FROM `{config['full_table_name']}`
-            WHERE {' OR '.join(
-                f"({col} < {range_val['min']} OR {col} > {range_val['max']})"
-                for col, range_val in config.get('numeric_range_checks', {}).items()
-            )}
-            LIMIT 100
-            """ if config.get('numeric_range_checks') else None
-        )
+        generate_sql=_violation_rows_sql(_numeric_range_predicate, 'numeric_range_checks'),
+        generate_predicate=_numeric_range_predicate
     ),
     
     'date_range': TestTemplate(
@@ -122,16 +278,8 @@ PREDEFINED_TESTS = {
         severity='MEDIUM',
         description='Validate dates are within expected range',
         is_global=False,
-        generate_sql=lambda config: (
-            f"""
-            SELECT * FROM `{config['full_table_name']}`
-            WHERE {' OR '.join(
-                f"({col} < '{range_val['min_date']}' OR {col} > '{range_val['max_date']}')"
-                for col, range_val in config.get('date_range_checks', {}).items()
-            )}
-            LIMIT 100
-            """ if config.get('date_range_checks') else None
-        )
+        generate_sql=_violation_rows_sql(_date_range_predicate, 'date_range_checks'),
+        generate_predicate=_date_range_predicate
     ),
     
     'pattern_validation': TestTemplate(
@@ -141,16 +289,8 @@ PREDEFINED_TESTS = {
         severity='MEDIUM',
         description='Check string patterns (email, phone, etc.)',
         is_global=False,
-        generate_sql=lambda config: (
-            f"""
-            SELECT * FROM `{config['full_table_name']}`
-            WHERE {' OR '.join(
-                f"NOT REGEXP_CONTAINS(CAST({col} AS STRING), r'{pattern}')"
-                for col, pattern in config.get('pattern_checks', {}).items()
-            )}
-            LIMIT 100
-            """ if config.get('pattern_checks') else None
-        )
+        generate_sql=_violation_rows_sql(_pattern_predicate, 'pattern_checks'),
+        generate_predicate=_pattern_predicate
     ),
     
     'outlier_detection': TestTemplate(
@@ -160,25 +300,15 @@ PREDEFINED_TESTS = {
         severity='LOW',
         description='Detect statistical outliers using standard deviation',
         is_global=False,
-        generate_sql=lambda config: (
-            f"""
-            WITH stats AS (
-                SELECT 
-                    AVG({config['outlier_columns'][0]}) as mean,
-                    STDDEV({config['outlier_columns'][0]}) as stddev
-                FROM `{config['full_table_name']}`
-                WHERE {config['outlier_columns'][0]} IS NOT NULL
-            )
-            SELECT t.* 
-            FROM `{config['full_table_name']}` t, stats
-            WHERE ABS(t.{config['outlier_columns'][0]} - stats.mean) > 3 * stats.stddev
-            LIMIT 100
-            """ if config.get('outlier_columns') else None
-        )
+        generate_sql=_outlier_sql
     )
 }
 
 
+# Default selection, computed once instead of filtering the registry per call
+_GLOBAL_TESTS = tuple(test for test in PREDEFINED_TESTS.values() if test.is_global)
+
+
 def get_enabled_tests(enabled_test_ids: Optional[List[str]] = None) -> List[TestTemplate]:
     """
     Get enabled test templates.
@@ -191,10 +321,14 @@ def get_enabled_tests(enabled_test_ids: Optional[List[str]] = None) -> List[Test
     """
     if not enabled_test_ids:
         # Return all global tests by default
-        return [test for test in PREDEFINED_TESTS.values() if test.is_global]
+        return list(_GLOBAL_TESTS)
     
-    return [
-        PREDEFINED_TESTS[test_id]
-        for test_id in enabled_test_ids
-        if test_id in PREDEFINED_TESTS
-    ]
+    # Config runs repeat the same few ID lists, so the lookup is cached;
+    # the caller gets its own list
+    return list(_select_tests(tuple(enabled_test_ids)))
+
+
+@functools.lru_cache(maxsize=256)
+def _select_tests(enabled_test_ids: Tuple[str, ...]) -> Tuple[TestTemplate, ...]:
+    """Look up the templates for a tuple of test IDs, skipping unknown IDs."""
+    return tuple(filter(None, map(PREDEFINED_TESTS.get, enabled_test_ids)))
@@ -0,0 +1,64 @@
+"""Tests for CSV row counting in the GCS service."""
+import io
+
+import pytest
+
+pytest.importorskip("google.cloud.storage")
+
+from app.services import gcs_service as gcs_module  # noqa: E402
+
+
+def count_rows(content: bytes) -> int:
+    """Data rows (excluding header), as count_csv_rows reports them."""
+    return max(gcs_module._count_csv_lines(io.BytesIO(content)) - 1, 0)
+
+
+@pytest.fixture(params=[1, 3, 4 * 1024 * 1024], ids=["1B", "3B", "4MiB"])
+def chunk_size(request, monkeypatch):
+    """Count with several chunk sizes so records split across reads."""
+    monkeypatch.setattr(gcs_module, "_COUNT_CHUNK_SIZE", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("content, expected", [
+    # A stray quote inside a field is plain text, as in pandas and csv
+    (b'product,size\nTV,55" screen\nPhone,6 in\nTab,10 in\n', 3),
+    (b'product,size\nTV,55" screen\nPhone,"6 in"\n', 2),
+    (b'h\n5"\n"a,b"\n', 2),
+])
+def test_stray_quotes(chunk_size, content, expected):
+    assert count_rows(content) == expected
+
+
+@pytest.mark.parametrize("content, expected", [
+    (b'id,note\n1,"line one\nline two"\n2,plain\n', 2),
+    (b'id,note\r\n1,"a\r\n\r\nb"\r\n2,"say ""hi"""\r\n', 2),
+    (b'id,note\n1,"a\n\nb"\n\n', 1),
+    (b'id,note\n1,"unterminated\n2,x\n', 1),
+])
+def test_quoted_embedded_newlines(chunk_size, content, expected):
+    assert count_rows(content) == expected
+
+
+@pytest.mark.parametrize("content, expected", [
+    (b'h\n1\n2\n\n', 2),
+    (b'h\n1\n\n2\n', 2),
+    (b'\nh\n1\n', 1),
+    (b'h\n  \n1\r\n\r\n2\r\n', 2),
+    (b'h\n1\n2', 2),
+    (b'h\n""\n1\n', 2),
+    (b'h\n1\n" "\n', 2),
+    (b'', 0),
+])
+def test_blank_lines(chunk_size, content, expected):
+    assert count_rows(content) == expected
+
+
+@pytest.mark.parametrize("content", [
+    b'product,size\nTV,55" screen\nPhone,6 in\nTab,10 in\n',
+    b'id,note\n1,"line one\nline two"\n\n2,plain\n  \n',
+    b'a,b\n1,2\n\n3,"x\n\ny"\n4,5" tall\n',
+])
+def test_matches_pandas(chunk_size, content):
+    pd = pytest.importorskip("pandas")
+    assert count_rows(content) == len(pd.read_csv(io.BytesIO(content)))
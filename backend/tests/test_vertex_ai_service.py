@@ -0,0 +1,119 @@
+"""Tests for batched Vertex AI test suggestions."""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("google.cloud.bigquery")
+pytest.importorskip("google.cloud.storage")
+
+from app.services import test_executor as executor_module  # noqa: E402
+from app.services.vertex_ai_service import VertexAIService  # noqa: E402
+
+
+TABLES = ["proj.sales.orders", "proj.sales.customers"]
+
+
+def make_request(target_table: str) -> dict:
+    return dict(
+        mapping_id=target_table.rsplit('.', 1)[-1],
+        source_info=f"gs://bucket/{target_table}.csv",
+        target_table=target_table,
+        bq_schema={"fields": []},
+        gcs_sample=[],
+        bq_sample=[],
+        existing_tests=[]
+    )
+
+
+def suggestion(target_table: str) -> dict:
+    return {
+        "test_name": f"Check {target_table}",
+        "test_category": "quality",
+        "severity": "LOW",
+        "sql_query": f"SELECT * FROM `{target_table}` WHERE amount < 0",
+        "reasoning": "Negative amounts are invalid."
+    }
+
+
+class FakeModel:
+    """Stands in for GenerativeModel, returning a canned response."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def generate_content(self, prompt: str) -> "FakeModel":
+        return self
+
+
+def batch_service(entries: list) -> VertexAIService:
+    service = VertexAIService()
+    service.model = FakeModel(json.dumps(entries))
+    return service
+
+
+def test_batch_matches_zero_based_entries():
+    service = batch_service([
+        {"mapping_idx": 1, "suggestions": [suggestion(TABLES[1])]},
+        {"mapping_idx": 0, "suggestions": [suggestion(TABLES[0])]},
+    ])
+
+    results = asyncio.run(service.generate_test_suggestions_batch(
+        [make_request(table) for table in TABLES]
+    ))
+
+    assert results == [[suggestion(TABLES[0])], [suggestion(TABLES[1])]]
+
+
+def test_batch_rejects_off_by_one_entries():
+    # A 1-based answer: entry 1 holds mapping 0's tests, entry 2 is out of range
+    service = batch_service([
+        {"mapping_idx": 1, "suggestions": [suggestion(TABLES[0])]},
+        {"mapping_idx": 2, "suggestions": [suggestion(TABLES[1])]},
+    ])
+
+    results = asyncio.run(service.generate_test_suggestions_batch(
+        [make_request(table) for table in TABLES]
+    ))
+
+    assert results == [None, None]
+
+
+def test_batch_rejects_repeated_entries():
+    service = batch_service([
+        {"mapping_idx": 0, "suggestions": [suggestion(TABLES[0])]},
+        {"mapping_idx": 0, "suggestions": [suggestion(TABLES[0])]},
+        {"mapping_idx": 1, "suggestions": [suggestion(TABLES[1])]},
+    ])
+
+    results = asyncio.run(service.generate_test_suggestions_batch(
+        [make_request(table) for table in TABLES]
+    ))
+
+    assert results == [None, [suggestion(TABLES[1])]]
+
+
+def test_batcher_requests_rejected_mappings_individually(monkeypatch):
+    service = batch_service([
+        {"mapping_idx": 1, "suggestions": [suggestion(TABLES[0])]},
+        {"mapping_idx": 2, "suggestions": [suggestion(TABLES[1])]},
+    ])
+    individual = []
+
+    async def generate_test_suggestions(**request):
+        individual.append(request['target_table'])
+        return [suggestion(request['target_table'])]
+
+    monkeypatch.setattr(service, "generate_test_suggestions", generate_test_suggestions)
+    monkeypatch.setattr(executor_module, "vertex_ai_service", service)
+
+    async def run():
+        batcher = executor_module._SuggestionBatcher(max_batch=2, max_wait=1.0)
+        return await asyncio.gather(*[
+            batcher.submit(make_request(table)) for table in TABLES
+        ])
+
+    results = asyncio.run(run())
+
+    assert sorted(individual) == sorted(TABLES)
+    assert results == [[suggestion(TABLES[0])], [suggestion(TABLES[1])]]
@@ -39,6 +39,7 @@ CREATE TABLE IF NOT EXISTS `miruna-sandpit.config.data_load_config` (
   -- Enabled tests
   enabled_test_ids ARRAY<STRING>,     -- Which predefined tests to run
   auto_suggest BOOLEAN DEFAULT true,  -- Whether to get AI suggestions
+  cost_guard_usd FLOAT64,             -- Skip tests whose query jobs take the dry-run cost estimate over this (NULL = no guard)
   
   -- Status
   is_active BOOLEAN DEFAULT true,
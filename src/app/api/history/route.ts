@@ -5,6 +5,7 @@ export async function GET(request: Request) {
         const { searchParams } = new URL(request.url);
         const limit = searchParams.get('limit') || '50';
         const projectId = searchParams.get('project_id');
+        const days = searchParams.get('days');
 
         // Get backend URL from env
         const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL;
@@ -20,6 +21,9 @@ export async function GET(request: Request) {
         if (projectId) {
             queryParams.append('project_id', projectId);
         }
+        if (days) {
+            queryParams.append('days', days);
+        }
 
         const response = await fetch(`${backendUrl}/api/history?${queryParams.toString()}`, {
             method: 'GET',
@@ -9,7 +9,7 @@ interface TestResult {
     description: string;
     sql_query: string;
     severity: string;
-    status: "PASS" | "FAIL" | "ERROR";
+    status: "PASS" | "FAIL" | "ERROR" | "SKIPPED";
     rows_affected?: number;
     error_message?: string;
 }
@@ -19,7 +19,7 @@ interface MappingResult {
     mapping_info?: {
         source: string;
         target: string;
-        file_row_count: number;
+        file_row_count: number | null;
         table_row_count: number;
     };
     predefined_results: TestResult[];
@@ -178,6 +178,14 @@ export default function ResultsView() {
                             </div>
                             <div style={{ color: 'var(--secondary-foreground)' }}>Errors</div>
                         </div>
+                        {summary.skipped > 0 && (
+                            <div className="card" style={{ textAlign: 'center' }}>
+                                <div style={{ fontSize: '2rem', fontWeight: '700', color: 'var(--secondary-foreground)' }}>
+                                    {summary.skipped}
+                                </div>
+                                <div style={{ color: 'var(--secondary-foreground)' }}>Tests Skipped</div>
+                            </div>
+                        )}
                         {summary.total_suggestions > 0 && (
                             <div className="card" style={{ textAlign: 'center' }}>
                                 <div style={{ fontSize: '2rem', fontWeight: '700', color: 'var(--primary)' }}>
@@ -213,7 +221,7 @@ export default function ResultsView() {
                                 }}>
                                     <div><strong>Source:</strong> {mapping.mapping_info.source}</div>
                                     <div><strong>Target:</strong> {mapping.mapping_info.target}</div>
-                                    <div><strong>Row Counts:</strong> GCS: {mapping.mapping_info.file_row_count}, BigQuery: {mapping.mapping_info.table_row_count}</div>
+                                    <div><strong>Row Counts:</strong> GCS: {mapping.mapping_info.file_row_count ?? 'not counted'}, BigQuery: {mapping.mapping_info.table_row_count}</div>
                                 </div>
                             )}
 